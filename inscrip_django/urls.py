@@ -4,6 +4,10 @@ from inscripciones import views as insc_views
 
 urlpatterns = [
     path('admin/settings', insc_views.settings_view, name='settings'),
+    path('admin/logs', insc_views.logs_view, name='logs'),
+    path('admin/logs/api', insc_views.logs_api, name='logs_api'),
+    path('admin/logs/export', insc_views.logs_export, name='logs_export'),
+    path('admin/stats', insc_views.stats_view, name='stats'),
     path('admin/', admin.site.urls),
     path('', include('inscripciones.urls')),
 ]
@@ -1,7 +1,49 @@
 from django.contrib import admin
-from .models import Setting, Category, FileField, TextField
+from django.template.response import TemplateResponse
+
+from .lookups import submissions_by_applicant
+from .models import Setting, Category, FileField, TextField, OutboxMessage, Submission
+from .utils import build_form_schemas
+
+
+@admin.action(description='Previsualizar formularios seleccionados')
+def preview_forms(modeladmin, request, queryset):
+    # Una sola pasada con prefetch para todas las categorías seleccionadas
+    schemas = build_form_schemas(queryset)
+    context = {
+        **modeladmin.admin_site.each_context(request),
+        'title': 'Previsualización de formularios',
+        'schemas': sorted(schemas.values(), key=lambda s: s.name),
+        'opts': modeladmin.model._meta,
+    }
+    return TemplateResponse(request, 'admin/form_preview.html', context)
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    actions = [preview_forms]
+
 
 admin.site.register(Setting)
-admin.site.register(Category)
 admin.site.register(FileField)
 admin.site.register(TextField)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'mailbox', 'status', 'attempts', 'next_attempt_at', 'created_at')
+    list_filter = ('status',)
+
+
+@admin.register(Submission)
+class SubmissionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'category', 'status', 'attempts', 'created_at')
+    list_filter = ('status',)
+    # Busca por nombre exacto del solicitante dentro de ``fields`` (índice GIN en PostgreSQL)
+    search_fields = ('fields',)
+    search_help_text = 'Nombre completo del solicitante'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return submissions_by_applicant(search_term.strip(), queryset), False
@@ -0,0 +1,122 @@
+"""Retención del registro de inscripciones.
+
+``archive_logs`` mueve los ``LogEntry`` más antiguos que la retención
+configurada a archivos JSON Lines comprimidos, uno por día
+(``AAAA/MM/logs-AAAA-MM-DD.jsonl.gz`` dentro de ``LOG_ARCHIVE_DIR``), y luego
+los elimina de la base. Trabaja por lotes cortos para no bloquear la tabla.
+``search_archive`` permite consultar lo archivado.
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .logs import log_to_dict
+from .models import LogEntry
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def archive_dir() -> Path:
+    return Path(getattr(settings, 'LOG_ARCHIVE_DIR', settings.BASE_DIR / 'var' / 'archive'))
+
+
+def archive_path(day: date) -> Path:
+    return archive_dir() / f'{day:%Y}' / f'{day:%m}' / f'logs-{day.isoformat()}.jsonl.gz'
+
+
+def _append(day: date, rows: list[dict]) -> None:
+    path = archive_path(day)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Cada lote agrega un miembro gzip; los lectores los leen como un solo flujo
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+            for row in rows:
+                gz.write((json.dumps(row, ensure_ascii=False) + '\n').encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_logs(days: int | None = None, batch_size: int = ARCHIVE_BATCH_SIZE, dry_run: bool = False) -> int:
+    """Archiva y elimina los registros con más de ``days`` días.
+
+    Cada lote se escribe (con fsync) antes de borrarse, así que una
+    interrupción puede dejar filas repetidas en el archivo pero nunca
+    perderlas; la búsqueda descarta los duplicados. Devuelve cuántos
+    registros se archivaron (o se archivarían con ``dry_run``).
+    """
+    if days is None:
+        days = getattr(settings, 'LOG_RETENTION_DAYS', 365)
+    cutoff = timezone.now() - timedelta(days=days)
+    qs = LogEntry.objects.filter(timestamp__lt=cutoff)
+    if dry_run:
+        return qs.count()
+    total = 0
+    while True:
+        batch = list(qs.order_by('timestamp', 'pk')[:batch_size])
+        if not batch:
+            break
+        by_day: dict[date, list[dict]] = {}
+        for entry in batch:
+            by_day.setdefault(timezone.localdate(entry.timestamp), []).append(log_to_dict(entry))
+        for day, rows in by_day.items():
+            _append(day, rows)
+        with transaction.atomic():
+            LogEntry.objects.filter(pk__in=[e.pk for e in batch]).delete()
+        total += len(batch)
+        logger.info("Registros archivados: %s", total)
+    return total
+
+
+def _archive_days(desde: date | None, hasta: date | None):
+    root = archive_dir()
+    for path in sorted(root.glob('*/*/logs-*.jsonl.gz')):
+        day = parse_date(path.name[len('logs-'):-len('.jsonl.gz')])
+        if day is None:
+            continue
+        if (desde and day < desde) or (hasta and day > hasta):
+            continue
+        yield path
+
+
+def search_archive(categoria: str = '', estado: str = '', desde: str = '', hasta: str = '', texto: str = ''):
+    """Recorre los archivos del rango y entrega los registros que coinciden.
+
+    ``texto`` busca sin distinguir mayúsculas en el nombre y correo del
+    solicitante y en la ruta de OneDrive. Lanza ``ValueError`` si una fecha
+    no tiene formato ``AAAA-MM-DD``.
+    """
+    bounds = []
+    for value in (desde, hasta):
+        day = parse_date(value) if value else None
+        if value and day is None:
+            raise ValueError(f'Fecha inválida: {value}')
+        bounds.append(day)
+    needle = texto.lower()
+    for path in _archive_days(*bounds):
+        seen = set()
+        with gzip.open(path, 'rt', encoding='utf-8') as fh:
+            for line in fh:
+                row = json.loads(line)
+                if row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                if categoria and row['categoria_key'] != categoria:
+                    continue
+                if estado and row['estado'] != estado:
+                    continue
+                if needle and not any(
+                    needle in (row.get(k) or '').lower()
+                    for k in ('solicitante_nombre', 'solicitante_email', 'one_drive_path')
+                ):
+                    continue
+                yield row
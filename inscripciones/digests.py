@@ -0,0 +1,124 @@
+"""Resúmenes periódicos de notificaciones por categoría.
+
+Con ``Category.digest_enabled`` el worker deja cada inscripción en
+``DIGEST_PENDIENTE`` en lugar de notificarla. El comando ``send_digests``
+agrupa las inscripciones de cada categoría cuando la más antigua cumple el
+período configurado y encola un único correo en el outbox.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.html import escape
+
+from services.template_renderer import TZ_ECUADOR, compile_template, render_many
+
+from .jobs import CORREO_EN_COLA, DIGEST_PENDIENTE, mail_vars, split_emails
+from .models import Submission
+from .outbox import queue_message
+from .utils import load_category_tree, load_settings
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_SUBJECT = 'Resumen de inscripciones: [CATEGORIA] ([TOTAL_INSCRIPCIONES])'
+
+
+def digest_vars(cat: dict, subs: list[Submission]) -> dict:
+    """Variables del asunto del resumen: categoría, cantidad y período."""
+    first = timezone.localtime(subs[0].created_at, TZ_ECUADOR)
+    last = timezone.localtime(subs[-1].created_at, TZ_ECUADOR)
+    return {
+        'CATEGORIA': cat['name'],
+        'CATEGORIA_KEY': cat['key'],
+        'TOTAL_INSCRIPCIONES': len(subs),
+        'PERIODO_DESDE': first.strftime('%Y-%m-%d %H:%M'),
+        'PERIODO_HASTA': last.strftime('%Y-%m-%d %H:%M'),
+    }
+
+
+def render_digest(cat: dict, subs: list[Submission]) -> tuple[str, str]:
+    """Devuelve asunto y cuerpo del resumen de ``subs`` (ordenadas por fecha).
+
+    El asunto usa la plantilla de asunto de la categoría con las variables
+    de ``digest_vars``. El cuerpo lista solicitantes y carpetas, seguido del
+    cuerpo de la plantilla de la categoría renderizado para cada inscripción.
+    """
+    now = timezone.localtime(timezone.now(), TZ_ECUADOR)
+    template = cat['mail_subject_template'] or DEFAULT_SUBJECT
+    subject = compile_template(template).render(digest_vars(cat, subs), now)
+    rows = ''.join(
+        '<tr><td>{}</td><td>{}</td><td>{}</td><td><a href="{}">Carpeta</a></td></tr>'.format(
+            escape(s.fields.get('nombre', '')),
+            escape(s.fields.get('email', '')),
+            timezone.localtime(s.created_at, TZ_ECUADOR).strftime('%Y-%m-%d %H:%M'),
+            escape(s.folder_url),
+        )
+        for s in subs
+    )
+    parts = [
+        f"<p>{len(subs)} inscripciones recibidas en {escape(cat['name'])}.</p>",
+        '<table><tr><th>Solicitante</th><th>Correo</th><th>Fecha</th><th>Carpeta</th></tr>'
+        f'{rows}</table>',
+    ]
+    if cat['mail_body_template']:
+        details = render_many(cat['mail_body_template'], [mail_vars(s, cat) for s in subs], now)
+        parts.extend(f'<hr>{d}' for d in details)
+    return subject, ''.join(parts)
+
+
+def _queue_digest(cat: dict, mailbox: str) -> int:
+    pending = list(
+        Submission.objects.filter(category_id=cat['id'], status=DIGEST_PENDIENTE).order_by('created_at')
+    )
+    with transaction.atomic():
+        # Cada inscripción se toma con una actualización condicional: si otro
+        # proceso la incluyó en su resumen no se actualiza y se omite aquí.
+        # SQLite no admite SELECT ... FOR UPDATE.
+        subs = [
+            s for s in pending
+            if Submission.objects.filter(pk=s.pk, status=DIGEST_PENDIENTE).update(status=CORREO_EN_COLA)
+        ]
+        if not subs:
+            return 0
+        subject, body = render_digest(cat, subs)
+        msg = queue_message(
+            None,
+            mailbox,
+            subject,
+            body,
+            split_emails(cat['notify_emails']),
+            split_emails(cat['notify_cc_emails']),
+            split_emails(cat['notify_bcc_emails']),
+        )
+        msg.submissions.set(subs)
+    logger.info("Resumen de %s con %s inscripciones en cola", cat['key'], len(subs))
+    return len(subs)
+
+
+def send_due_digests(force: bool = False, keys=None) -> int:
+    """Encola los resúmenes cuyo período venció y devuelve cuántos se encolaron.
+
+    Con ``force`` se envían sin esperar el período. Las inscripciones de una
+    categoría que dejó de usar resúmenes se envían de inmediato.
+    """
+    now = timezone.now()
+    tree = load_category_tree()
+    mailbox = load_settings().get('onedrive', {}).get('user_id', '')
+    pending = (
+        Submission.objects.filter(status=DIGEST_PENDIENTE)
+        .values('category_id')
+        .annotate(oldest=Min('created_at'))
+    )
+    queued = 0
+    for row in pending:
+        cat = tree.get_by_id(row['category_id'])
+        if cat is None or (keys and cat['key'] not in keys):
+            continue
+        window = timedelta(minutes=cat['digest_interval'])
+        if force or not cat['digest_enabled'] or row['oldest'] <= now - window:
+            if _queue_digest(cat, mailbox):
+                queued += 1
+    return queued
@@ -0,0 +1,373 @@
+"""Procesamiento en segundo plano de las inscripciones.
+
+La vista solo valida el formulario, guarda los archivos en disco y crea una
+``Submission`` pendiente. El comando ``process_submissions`` toma los
+trabajos (bloqueando la fila), sube los archivos a OneDrive y deja la
+notificación en el outbox (``outbox.py``), que la envía y registra el
+resultado en ``LogEntry``.
+"""
+import logging
+import shutil
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from services.graph_auth import GraphAPIError, get_access_token
+from services.onedrive import (
+    cancel_upload_session,
+    delete_item,
+    get_item_by_path,
+    normalize_path,
+    read_item_head,
+    upload_files,
+)
+from services.template_renderer import TZ_ECUADOR, render_text
+
+from .models import Submission
+from .outbox import queue_message
+from .uploads import EXTENSION_TYPES, SNIFF_BYTES, sniff_content_type
+from .utils import load_category_tree, load_settings, save_log_entry
+
+logger = logging.getLogger(__name__)
+
+# Estados de Submission
+ESPERANDO_ARCHIVOS = 'ESPERANDO_ARCHIVOS'  # carga directa desde el navegador en curso
+PENDIENTE = 'PENDIENTE'          # archivos en disco, falta subir a OneDrive
+SUBIDO = 'SUBIDO'                # archivos en OneDrive, falta la notificación
+DIGEST_PENDIENTE = 'DIGEST_PENDIENTE'  # esperando el próximo resumen de la categoría
+CORREO_EN_COLA = 'CORREO_EN_COLA'  # notificación en el outbox, ver outbox.py
+ENVIADO = 'ENVIADO'
+ERROR_ONEDRIVE = 'ERROR_ONEDRIVE'
+ERROR_MAIL = 'ERROR_MAIL'
+PENDING_STATUSES = (PENDIENTE, SUBIDO)
+
+MAX_ATTEMPTS = 5
+# Espera base entre reintentos; se duplica en cada intento
+RETRY_DELAY = timedelta(seconds=30)
+# Un trabajo bloqueado más de este tiempo se considera abandonado
+LOCK_TIMEOUT = timedelta(minutes=15)
+# Una carga directa que el navegador no finalizó en este tiempo se descarta
+DIRECT_UPLOAD_TIMEOUT = timedelta(hours=24)
+# Claves de ``Submission.files`` que no se copian al registro
+PRIVATE_FILE_KEYS = ('spool_path', 'staged_item_id', 'upload_url')
+
+
+def spool_dir() -> Path:
+    return Path(getattr(settings, 'SUBMISSION_SPOOL_DIR', settings.BASE_DIR / 'var' / 'spool'))
+
+
+def split_emails(value: str) -> list[str]:
+    return [r.strip() for r in (value or '').split(',') if r.strip()]
+
+
+def enqueue_submission(category_id, fields, dest_path, file_records, uploads) -> Submission:
+    """Guarda los archivos en disco y crea la ``Submission`` pendiente.
+
+    ``uploads`` contiene ``{'name', 'file'}`` (o ``{'name', 'item_id'}``
+    para archivos ya recibidos en OneDrive) en el mismo orden que
+    ``file_records``; cada registro recibe la ruta del archivo en disco o el
+    id del archivo en staging.
+    """
+    target = spool_dir() / uuid.uuid4().hex
+    try:
+        records = []
+        for record, upload in zip(file_records, uploads):
+            if upload.get('item_id'):
+                records.append({**record, 'staged_item_id': upload['item_id']})
+                continue
+            # Solo se crea si algún archivo no quedó ya en OneDrive
+            target.mkdir(parents=True, exist_ok=True)
+            path = target / upload['name']
+            with open(path, 'wb') as out:
+                for chunk in upload['file'].chunks():
+                    out.write(chunk)
+            records.append({**record, 'spool_path': str(path)})
+        return Submission.objects.create(
+            category_id=category_id,
+            fields=fields,
+            files=records,
+            dest_path=dest_path,
+            status=PENDIENTE,
+        )
+    except Exception:
+        shutil.rmtree(target, ignore_errors=True)
+        raise
+
+
+def create_direct_submission(category_id, fields, dest_path, folder_url, file_records) -> Submission:
+    """Registra una inscripción cuyos archivos sube el navegador a OneDrive."""
+    return Submission.objects.create(
+        category_id=category_id,
+        fields=fields,
+        files=file_records,
+        dest_path=dest_path,
+        folder_url=folder_url,
+        status=ESPERANDO_ARCHIVOS,
+    )
+
+
+def finalize_direct_submission(sub: Submission) -> None:
+    """Verifica los archivos subidos por el navegador y encola la notificación.
+
+    Cada archivo debe existir en la carpeta destino con el tamaño declarado y
+    una firma acorde a su extensión; si no, se elimina y se lanza
+    ``ValueError``.
+    """
+    drive_cfg = load_settings().get('onedrive', {})
+    user_id = drive_cfg['user_id']
+    token = get_access_token(drive_cfg)
+    for r in sub.files:
+        item = get_item_by_path(
+            token, user_id, normalize_path(sub.dest_path, r['nombre_final']), select='id,size'
+        )
+        if item is None:
+            raise ValueError(f"No se recibió el archivo {r['nombre_original']}")
+        if item.get('size') != r['size_bytes']:
+            delete_item(token, user_id, item['id'])
+            raise ValueError(f"El archivo {r['nombre_original']} no se subió completo")
+        expected = EXTENSION_TYPES.get(Path(r['nombre_final']).suffix.lower())
+        if expected and sniff_content_type(read_item_head(token, user_id, item['id'], SNIFF_BYTES)) != expected:
+            delete_item(token, user_id, item['id'])
+            raise ValueError(f"El contenido de {r['nombre_original']} no corresponde a su extensión")
+    # Las sesiones ya terminaron; sus URL no deben quedar guardadas
+    sub.files = [{k: v for k, v in r.items() if k != 'upload_url'} for r in sub.files]
+    sub.status = SUBIDO
+    sub.save(update_fields=['files', 'status'])
+
+
+def _discard_direct_files(sub: Submission) -> None:
+    drive_cfg = load_settings().get('onedrive', {})
+    user_id = drive_cfg['user_id']
+    token = get_access_token(drive_cfg)
+    for r in sub.files:
+        if r.get('upload_url'):
+            cancel_upload_session(r['upload_url'])
+        item = get_item_by_path(token, user_id, normalize_path(sub.dest_path, r['nombre_final']), select='id')
+        if item is not None:
+            delete_item(token, user_id, item['id'])
+
+
+def expire_direct_submissions() -> int:
+    """Descarta las cargas directas no finalizadas en ``DIRECT_UPLOAD_TIMEOUT``.
+
+    Pasan a ``ERROR_ONEDRIVE``; se cancelan sus sesiones de carga y se
+    eliminan los archivos que alcanzaron a llegar a la carpeta destino.
+    Devuelve cuántas se descartaron.
+    """
+    cutoff = timezone.now() - DIRECT_UPLOAD_TIMEOUT
+    expired = list(
+        Submission.objects.filter(status=ESPERANDO_ARCHIVOS, created_at__lt=cutoff).order_by('created_at')[:100]
+    )
+    done = 0
+    for sub in expired:
+        detalle = 'La carga directa no se finalizó'
+        # La transición condicional evita que dos procesos la descarten a la vez
+        claimed = Submission.objects.filter(pk=sub.pk, status=ESPERANDO_ARCHIVOS).update(
+            status=ERROR_ONEDRIVE, error=detalle
+        )
+        if not claimed:
+            continue
+        sub.status = ERROR_ONEDRIVE
+        sub.error = detalle
+        try:
+            _discard_direct_files(sub)
+        except (GraphAPIError, KeyError) as e:
+            logger.warning("No se pudieron eliminar los archivos de la inscripción %s: %s", sub.pk, e)
+        _log_submission(sub, ERROR_ONEDRIVE, detalle)
+        done += 1
+    return done
+
+
+def claim_submission() -> Submission | None:
+    """Toma el siguiente trabajo pendiente bloqueando su fila."""
+    now = timezone.now()
+    with transaction.atomic():
+        sub = (
+            Submission.objects.select_for_update(skip_locked=True)
+            .filter(status__in=PENDING_STATUSES)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .filter(Q(locked_at__isnull=True) | Q(locked_at__lt=now - LOCK_TIMEOUT))
+            .order_by('created_at')
+            .first()
+        )
+        if sub is None:
+            return None
+        # En bases sin SELECT ... FOR UPDATE (SQLite) la actualización
+        # condicional evita que dos procesos tomen el mismo trabajo
+        claimed = Submission.objects.filter(pk=sub.pk, locked_at=sub.locked_at).update(locked_at=now)
+        if not claimed:
+            return None
+    sub.locked_at = now
+    return sub
+
+
+def _category(sub: Submission) -> dict | None:
+    """Categoría de ``sub`` con los ajustes heredados ya resueltos."""
+    return load_category_tree().get_by_id(sub.category_id)
+
+
+def _log_submission(sub: Submission, estado: str, detalle: str = '') -> None:
+    cat = _category(sub)
+    recipients = _recipients(sub)
+    save_log_entry(
+        categoria_key=cat['key'] if cat else '',
+        categoria_nombre=cat['name'] if cat else '',
+        solicitante_nombre=sub.fields.get('nombre', ''),
+        solicitante_email=sub.fields.get('email', ''),
+        one_drive_path=sub.dest_path,
+        one_drive_folder_url=sub.folder_url,
+        archivos=[
+            {k: v for k, v in r.items() if k not in PRIVATE_FILE_KEYS}
+            for r in sub.files
+        ],
+        estado=estado,
+        detalle_error=detalle,
+        destinatarios_to=recipients['to'],
+        destinatarios_cc=recipients['cc'],
+        user_admin=sub.user,
+    )
+
+
+def _recipients(sub: Submission) -> dict[str, list[str]]:
+    cat = _category(sub) or {}
+    return {
+        'to': split_emails(cat.get('notify_emails', '')),
+        'cc': split_emails(cat.get('notify_cc_emails', '')),
+        'bcc': split_emails(cat.get('notify_bcc_emails', '')),
+    }
+
+
+def _remove_spool(sub: Submission) -> None:
+    """Elimina los archivos en disco de ``sub``.
+
+    Se llama al subirlos a OneDrive y también cuando el trabajo falla
+    definitivamente: una inscripción en ``ERROR_ONEDRIVE`` no conserva sus
+    archivos (el registro guarda sus nombres y tamaños).
+    """
+    dirs = {Path(r['spool_path']).parent for r in sub.files if r.get('spool_path')}
+    for d in dirs:
+        shutil.rmtree(d, ignore_errors=True)
+
+
+def _upload_stage(sub: Submission, token: str, drive_cfg: dict) -> None:
+    handles = []
+    try:
+        files = []
+        for r in sub.files:
+            if r.get('staged_item_id'):
+                files.append(
+                    {'name': r['nombre_final'], 'item_id': r['staged_item_id'], 'size': r['size_bytes']}
+                )
+                continue
+            fh = open(r['spool_path'], 'rb')
+            handles.append(fh)
+            files.append({'name': r['nombre_final'], 'file': fh, 'size': r['size_bytes']})
+        sub.folder_url = upload_files(
+            token,
+            drive_cfg['user_id'],
+            sub.dest_path,
+            files,
+            concurrency=drive_cfg.get('upload_concurrency', 1),
+        )
+    finally:
+        for fh in handles:
+            fh.close()
+    logger.info("Archivos de la inscripción %s subidos: %s", sub.pk, sub.folder_url)
+    sub.status = SUBIDO
+    sub.save(update_fields=['folder_url', 'status'])
+    _remove_spool(sub)
+
+
+def mail_vars(sub: Submission, cat: dict) -> dict:
+    """Variables de las plantillas de correo para ``sub``."""
+    archivos_html = '<ul>' + ''.join(
+        f"<li>{r['nombre_final']} ({r['size_bytes']} bytes)</li>" for r in sub.files
+    ) + '</ul>'
+    vars_map = {
+        'CATEGORIA': cat['name'],
+        'CATEGORIA_KEY': cat['key'],
+        'CARPETA_URL': sub.folder_url,
+        'ARCHIVOS_LISTA': archivos_html,
+        'USUARIO_ADMIN': sub.user,
+    }
+    vars_map.update(sub.fields.get('variables', {}))
+    return vars_map
+
+
+def _mail_stage(sub: Submission, drive_cfg: dict) -> None:
+    cat = _category(sub)
+    recipients = _recipients(sub)
+    if not any(recipients.values()):
+        raise ValueError('No hay destinatarios configurados para esta categoría')
+    if cat['digest_enabled']:
+        # El comando send_digests la incluirá en el próximo resumen
+        sub.status = DIGEST_PENDIENTE
+        sub.save(update_fields=['status'])
+        return
+    vars_map = mail_vars(sub, cat)
+    now = timezone.localtime(timezone.now(), TZ_ECUADOR)
+    with transaction.atomic():
+        queue_message(
+            sub,
+            drive_cfg['user_id'],
+            render_text(cat['mail_subject_template'], vars_map, now),
+            render_text(cat['mail_body_template'], vars_map, now),
+            recipients['to'],
+            recipients['cc'],
+            recipients['bcc'],
+        )
+        sub.status = CORREO_EN_COLA
+        sub.save(update_fields=['status'])
+
+
+def process_submission(sub: Submission) -> None:
+    """Ejecuta las etapas pendientes de ``sub`` y programa reintentos."""
+    drive_cfg = load_settings().get('onedrive', {})
+    stage_error = ERROR_ONEDRIVE if sub.status == PENDIENTE else ERROR_MAIL
+    try:
+        if _category(sub) is None:
+            raise ValueError('Categoría no encontrada')
+        token = get_access_token(drive_cfg)
+        if sub.status == PENDIENTE:
+            _upload_stage(sub, token, drive_cfg)
+            stage_error = ERROR_MAIL
+        _mail_stage(sub, drive_cfg)
+    except Exception as e:
+        sub.attempts += 1
+        sub.error = str(e)[:255]
+        sub.locked_at = None
+        if sub.attempts >= MAX_ATTEMPTS:
+            logger.exception("Inscripción %s falló definitivamente", sub.pk)
+            sub.status = stage_error
+            sub.save(update_fields=['attempts', 'error', 'locked_at', 'status'])
+            _remove_spool(sub)
+            _log_submission(sub, stage_error, str(e))
+        else:
+            delay = RETRY_DELAY * (2 ** (sub.attempts - 1))
+            logger.warning(
+                "Inscripción %s falló (intento %s), reintento en %s: %s",
+                sub.pk, sub.attempts, delay, e,
+            )
+            sub.next_attempt_at = timezone.now() + delay
+            sub.save(update_fields=['attempts', 'error', 'locked_at', 'next_attempt_at'])
+        return
+    sub.locked_at = None
+    sub.error = ''
+    sub.save(update_fields=['locked_at', 'error'])
+
+
+def run_pending(limit: int | None = None) -> int:
+    """Procesa trabajos pendientes hasta agotarlos o llegar a ``limit``."""
+    done = 0
+    while limit is None or done < limit:
+        sub = claim_submission()
+        if sub is None:
+            break
+        process_submission(sub)
+        done += 1
+    return done
@@ -0,0 +1,241 @@
+"""Escritura diferida del registro de inscripciones.
+
+Con ``LOG_BUFFER_SIZE`` mayor que cero, ``save_log_entry`` no inserta en la
+base: agrega el registro a un buffer en memoria y a un diario en disco
+(``LOG_JOURNAL_DIR/journal-<pid>.jsonl``). El buffer se guarda con un solo
+``bulk_create`` al llegar a ``LOG_BUFFER_SIZE`` registros o a los
+``LOG_BUFFER_SECONDS`` segundos, y también al terminar el proceso.
+
+Si el proceso muere antes de guardar, el diario queda en disco y el
+siguiente proceso que use el buffer lo carga en la base.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import LogEntry
+from .stats import record_entries
+
+logger = logging.getLogger(__name__)
+
+# ``uid`` consultados por sentencia al descartar duplicados (límite de
+# variables de SQLite)
+UID_QUERY_SIZE = 500
+
+
+def journal_dir() -> Path:
+    return Path(getattr(settings, 'LOG_JOURNAL_DIR', settings.BASE_DIR / 'var' / 'journal'))
+
+
+def _dump(data: dict) -> str:
+    return json.dumps({**data, 'timestamp': data['timestamp'].isoformat()}, ensure_ascii=False)
+
+
+def _load(line: str) -> dict:
+    data = json.loads(line)
+    data['timestamp'] = datetime.fromisoformat(data['timestamp'])
+    # Diarios escritos antes de que los registros tuvieran ``uid``
+    data.setdefault('uid', uuid.uuid4().hex)
+    return data
+
+
+def _insert(rows: list[dict]) -> int:
+    """Inserta ``rows`` omitiendo los que ya están guardados (mismo ``uid``).
+
+    Un proceso puede caer después de guardar un lote y antes de vaciar su
+    diario; al recuperarlo esos registros no se duplican ni se suman otra
+    vez a las estadísticas.
+    """
+    uids = [data['uid'] for data in rows]
+    with transaction.atomic():
+        saved = set()
+        for i in range(0, len(uids), UID_QUERY_SIZE):
+            found = LogEntry.objects.filter(uid__in=uids[i:i + UID_QUERY_SIZE]).values_list('uid', flat=True)
+            saved.update(u.hex for u in found)
+        entries = LogEntry.objects.bulk_create(
+            [LogEntry(**data) for data in rows if uuid.UUID(str(data['uid'])).hex not in saved]
+        )
+        record_entries(entries)
+    return len(entries)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_journal(path: Path) -> list[dict]:
+    rows = []
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            try:
+                rows.append(_load(line))
+            except ValueError:
+                # Una línea cortada por la caída del proceso no se puede recuperar
+                logger.warning('Línea inválida en %s descartada', path.name)
+    return rows
+
+
+def _journal_owner(path: Path) -> int | None:
+    """Pid del proceso dueño del diario: el que lo escribe o el que lo recupera."""
+    # journal-<pid>.jsonl o journal-<pid>.replay-<pid que lo recupera>
+    name, _, suffix = path.name.partition('.')
+    if suffix == 'jsonl':
+        pid = name[len('journal-'):]
+    elif suffix.startswith('replay-'):
+        pid = suffix[len('replay-'):]
+    else:
+        return None
+    try:
+        return int(pid)
+    except ValueError:
+        return None
+
+
+def replay_journals() -> int:
+    """Guarda los diarios que dejaron procesos terminados.
+
+    Cada diario se renombra antes de leerlo para que dos procesos no lo
+    carguen a la vez; si el proceso que lo recuperaba también terminó, otro
+    lo vuelve a tomar. Si no se puede guardar, el diario recupera su nombre
+    y se reintentará más tarde. Devuelve la cantidad de registros recuperados.
+    """
+    total = 0
+    for path in journal_dir().glob('journal-*'):
+        owner = _journal_owner(path)
+        if owner is None or owner == os.getpid() or _pid_alive(owner):
+            continue
+        original = path.with_name(path.name.partition('.')[0] + '.jsonl')
+        claimed = path.with_name(f'{original.stem}.replay-{os.getpid()}')
+        try:
+            path.rename(claimed)
+        except FileNotFoundError:
+            continue
+        try:
+            rows = _read_journal(claimed)
+            inserted = _insert(rows) if rows else 0
+        except Exception:
+            logger.exception('No se pudo recuperar %s; se reintentará', original.name)
+            claimed.rename(original)
+            continue
+        claimed.unlink()
+        total += inserted
+        logger.info('Registros recuperados de %s: %s', original.name, inserted)
+    return total
+
+
+class LogBuffer:
+    """Registros pendientes de guardar, respaldados en un diario por proceso."""
+
+    def __init__(self, max_size: int, max_delay: float):
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.path = journal_dir() / f'journal-{os.getpid()}.jsonl'
+        self._pending: list[dict] = []
+        self._lock = threading.Lock()
+        # Un solo flush a la vez para que el diario se reescriba en orden
+        self._flush_lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        self._journal = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            # Diario de un proceso anterior con el mismo pid
+            self._pending = _read_journal(self.path)
+            self._rewrite_journal()
+        else:
+            self._journal = open(self.path, 'a', encoding='utf-8')
+
+    def add(self, data: dict) -> None:
+        data.setdefault('timestamp', timezone.now())
+        data.setdefault('uid', uuid.uuid4().hex)
+        with self._lock:
+            self._journal.write(_dump(data) + '\n')
+            self._journal.flush()
+            self._pending.append(data)
+            full = len(self._pending) >= self.max_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.max_delay, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Guarda lo pendiente; devuelve cuántos registros se insertaron."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not rows:
+                return 0
+            try:
+                _insert(rows)
+            except Exception:
+                logger.exception('No se pudieron guardar %s registros; se reintentará', len(rows))
+                with self._lock:
+                    self._pending[:0] = rows
+                return 0
+            with self._lock:
+                self._rewrite_journal()
+            return len(rows)
+
+    def _flush_from_timer(self) -> None:
+        try:
+            self.flush()
+        finally:
+            # El hilo del temporizador no vuelve a usar su conexión
+            connections.close_all()
+
+    def _rewrite_journal(self) -> None:
+        # El diario conserva solo lo que llegó mientras se guardaba el lote
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            for data in self._pending:
+                fh.write(_dump(data) + '\n')
+        if self._journal is not None:
+            self._journal.close()
+        os.replace(tmp, self.path)
+        self._journal = open(self.path, 'a', encoding='utf-8')
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._journal.close()
+            if not self._pending:
+                self.path.unlink(missing_ok=True)
+
+
+_buffer: LogBuffer | None = None
+_buffer_lock = threading.Lock()
+
+
+def get_log_buffer() -> LogBuffer:
+    """Buffer del proceso; al crearlo recupera los diarios huérfanos."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                replay_journals()
+                _buffer = LogBuffer(settings.LOG_BUFFER_SIZE, settings.LOG_BUFFER_SECONDS)
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def flush_log_buffer() -> int:
+    return _buffer.flush() if _buffer is not None else 0
@@ -0,0 +1,186 @@
+"""Consulta paginada del registro de inscripciones (``LogEntry``).
+
+La paginación es por keyset sobre ``(timestamp, id)`` en orden descendente:
+cada página continúa desde el último registro de la anterior, así que el
+costo no crece con el número de página como con OFFSET.
+"""
+import base64
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .lookups import logs_by_filename
+from .models import LogEntry
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Filas leídas por consulta al exportar; la memoria usada no depende del total
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_COLUMNS = (
+    'id',
+    'timestamp',
+    'categoria_key',
+    'categoria_nombre',
+    'solicitante_nombre',
+    'solicitante_email',
+    'estado',
+    'detalle_error',
+    'one_drive_path',
+    'one_drive_folder_url',
+    'archivos',
+    'archivos_total',
+    'archivos_bytes',
+    'destinatarios_to',
+    'destinatarios_cc',
+    'user_admin',
+)
+
+
+def encode_cursor(entry: LogEntry) -> str:
+    raw = f"{entry.timestamp.isoformat()}|{entry.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Lanza ``ValueError`` si el cursor no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, pk = raw.split('|')
+        return datetime.fromisoformat(ts), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Cursor inválido') from e
+
+
+def _day_start(value: str) -> datetime:
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f'Fecha inválida: {value}')
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_logs(categoria: str = '', estado: str = '', desde: str = '', hasta: str = '', archivo: str = ''):
+    """Registros filtrados por categoría, estado, rango de fechas (incluido)
+    y nombre original de un archivo subido.
+
+    Lanza ``ValueError`` si alguna fecha no tiene formato ``AAAA-MM-DD``.
+    """
+    qs = LogEntry.objects.all()
+    if categoria:
+        qs = qs.filter(categoria_key=categoria)
+    if estado:
+        qs = qs.filter(estado=estado)
+    if desde:
+        qs = qs.filter(timestamp__gte=_day_start(desde))
+    if hasta:
+        qs = qs.filter(timestamp__lt=_day_start(hasta) + timedelta(days=1))
+    if archivo:
+        qs = logs_by_filename(archivo, qs)
+    return qs
+
+
+def page_logs(qs, cursor: str = '', limit: int = PAGE_SIZE) -> tuple[list[LogEntry], str | None]:
+    """Devuelve una página de ``qs`` y el cursor de la siguiente (o ``None``)."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        ts, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(timestamp__lt=ts) | Q(timestamp=ts, pk__lt=pk))
+    entries = list(qs.order_by('-timestamp', '-pk')[:limit + 1])
+    if len(entries) > limit:
+        entries = entries[:limit]
+        return entries, encode_cursor(entries[-1])
+    return entries, None
+
+
+def log_to_dict(entry: LogEntry) -> dict:
+    return {
+        'id': entry.pk,
+        'timestamp': entry.timestamp.isoformat(),
+        'categoria_key': entry.categoria_key,
+        'categoria_nombre': entry.categoria_nombre,
+        'solicitante_nombre': entry.solicitante_nombre,
+        'solicitante_email': entry.solicitante_email,
+        'one_drive_path': entry.one_drive_path,
+        'one_drive_folder_url': entry.one_drive_folder_url,
+        'archivos': entry.archivos,
+        'estado': entry.estado,
+        'detalle_error': entry.detalle_error,
+        'destinatarios_to': entry.destinatarios_to,
+        'destinatarios_cc': entry.destinatarios_cc,
+        'user_admin': entry.user_admin,
+    }
+
+
+def export_row(entry: LogEntry) -> dict:
+    """Registro aplanado: archivos y destinatarios como texto."""
+    archivos = entry.archivos or []
+    return {
+        'id': entry.pk,
+        'timestamp': entry.timestamp.isoformat(),
+        'categoria_key': entry.categoria_key,
+        'categoria_nombre': entry.categoria_nombre,
+        'solicitante_nombre': entry.solicitante_nombre,
+        'solicitante_email': entry.solicitante_email,
+        'estado': entry.estado,
+        'detalle_error': entry.detalle_error or '',
+        'one_drive_path': entry.one_drive_path,
+        'one_drive_folder_url': entry.one_drive_folder_url,
+        'archivos': '; '.join(a.get('nombre_final', '') for a in archivos),
+        'archivos_total': len(archivos),
+        'archivos_bytes': sum(a.get('size_bytes') or 0 for a in archivos),
+        'destinatarios_to': ', '.join(entry.destinatarios_to or []),
+        'destinatarios_cc': ', '.join(entry.destinatarios_cc or []),
+        'user_admin': entry.user_admin,
+    }
+
+
+def _iter_entries(qs):
+    return qs.order_by('timestamp', 'pk').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def iter_csv(qs):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for entry in _iter_entries(qs):
+        writer.writerow(export_row(entry))
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_jsonl(qs):
+    lines = []
+    for i, entry in enumerate(_iter_entries(qs), 1):
+        lines.append(json.dumps(export_row(entry), ensure_ascii=False))
+        if i % 500 == 0:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def gzip_stream(chunks):
+    """Comprime al vuelo una secuencia de bytes en formato gzip."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_logs(qs, formato: str = 'csv', compress: bool = False):
+    """Genera el contenido de la exportación en partes de bytes."""
+    if formato not in EXPORT_FORMATS:
+        raise ValueError(f'Formato no soportado: {formato}')
+    chunks = iter_csv(qs) if formato == 'csv' else iter_jsonl(qs)
+    return gzip_stream(chunks) if compress else chunks
@@ -0,0 +1,45 @@
+"""Búsquedas dentro de los campos JSON.
+
+En PostgreSQL se usa ``__contains`` (operador ``@>``), que aprovecha los
+índices GIN de la migración ``0011_json_gin_indexes``. SQLite no tiene ese
+operador: ahí se usan las funciones JSON de SQLite, que recorren la tabla
+pero sin traer las filas a Python.
+"""
+from django.db import connections
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from .models import LogEntry, Submission
+
+
+def _supports_contains(qs) -> bool:
+    return connections[qs.db].features.supports_json_field_contains
+
+
+def submissions_by_applicant(nombre: str, qs=None):
+    """Inscripciones cuyo campo ``nombre`` es exactamente ``nombre``."""
+    qs = Submission.objects.all() if qs is None else qs
+    if _supports_contains(qs):
+        return qs.filter(fields__contains={'nombre': nombre})
+    return qs.filter(fields__nombre=nombre)
+
+
+def logs_by_filename(nombre_original: str, qs=None):
+    """Registros que incluyen un archivo subido con ese nombre original.
+
+    En SQLite la condición se evalúa en la consulta con ``json_each``, así
+    que el resultado sigue siendo un queryset que se puede paginar o
+    recorrer por partes.
+    """
+    qs = LogEntry.objects.all() if qs is None else qs
+    if _supports_contains(qs):
+        return qs.filter(archivos__contains=[{'nombre_original': nombre_original}])
+    qn = connections[qs.db].ops.quote_name
+    column = f"{qn(LogEntry._meta.db_table)}.{qn(LogEntry._meta.get_field('archivos').column)}"
+    match = RawSQL(
+        f"EXISTS (SELECT 1 FROM json_each({column}) "
+        "WHERE json_extract(json_each.value, '$.nombre_original') = %s)",
+        [nombre_original],
+        output_field=BooleanField(),
+    )
+    return qs.alias(archivo_coincide=match).filter(archivo_coincide=True)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from inscripciones.archive import ARCHIVE_BATCH_SIZE, archive_logs
+
+
+class Command(BaseCommand):
+    help = 'Mueve los registros antiguos a archivos JSONL comprimidos y los elimina de la base.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Antigüedad mínima (por defecto LOG_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar los registros a archivar')
+
+    def handle(self, *args, **options):
+        total = archive_logs(options['days'], options['batch_size'], options['dry_run'])
+        verb = 'a archivar' if options['dry_run'] else 'archivados'
+        self.stdout.write(f'Registros {verb}: {total}')
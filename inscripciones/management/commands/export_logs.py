@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inscripciones.logs import EXPORT_FORMATS, export_logs, filter_logs
+
+
+class Command(BaseCommand):
+    help = 'Exporta los registros de inscripciones en CSV o JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Comprimir la salida con gzip')
+        parser.add_argument('--output', '-o', help='Archivo de salida (por defecto la salida estándar)')
+        parser.add_argument('--categoria', default='')
+        parser.add_argument('--estado', default='')
+        parser.add_argument('--desde', default='', help='Fecha inicial AAAA-MM-DD')
+        parser.add_argument('--hasta', default='', help='Fecha final AAAA-MM-DD (incluida)')
+        parser.add_argument('--archivo', default='', help='Nombre original de un archivo subido')
+
+    def handle(self, *args, **options):
+        try:
+            qs = filter_logs(
+                categoria=options['categoria'],
+                estado=options['estado'],
+                desde=options['desde'],
+                hasta=options['hasta'],
+                archivo=options['archivo'],
+            )
+            chunks = export_logs(qs, options['formato'], options['gzip'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['output']:
+            with open(options['output'], 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inscripciones.jobs import expire_direct_submissions, run_pending
+from inscripciones.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Procesa las inscripciones pendientes: subida a OneDrive y envío de notificaciones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesar lo pendiente y terminar')
+        parser.add_argument('--interval', type=float, default=2.0, help='Segundos de espera sin trabajos')
+        parser.add_argument('--limit', type=int, default=None, help='Máximo de trabajos por ciclo')
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_direct_submissions()
+            if expired:
+                self.stdout.write(f'Cargas directas vencidas: {expired}')
+            done = run_pending(options['limit'])
+            if done:
+                self.stdout.write(f'Inscripciones procesadas: {done}')
+            sent = drain_outbox(options['limit'])
+            if sent:
+                self.stdout.write(f'Correos procesados: {sent}')
+            if options['once']:
+                break
+            if not done and not sent:
+                time.sleep(options['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inscripciones.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las estadísticas diarias desde los registros y el archivo histórico.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sin-archivo', action='store_true', help='No leer los registros archivados')
+
+    def handle(self, *args, **options):
+        total = rebuild_stats(include_archive=not options['sin_archivo'])
+        self.stdout.write(f'Filas de estadísticas: {total}')
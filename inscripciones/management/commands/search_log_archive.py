@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inscripciones.archive import search_archive
+
+
+class Command(BaseCommand):
+    help = 'Busca en los registros archivados y los imprime en JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('texto', nargs='?', default='', help='Nombre, correo o ruta a buscar')
+        parser.add_argument('--categoria', default='')
+        parser.add_argument('--estado', default='')
+        parser.add_argument('--desde', default='', help='Fecha inicial AAAA-MM-DD')
+        parser.add_argument('--hasta', default='', help='Fecha final AAAA-MM-DD (incluida)')
+
+    def handle(self, *args, **options):
+        try:
+            rows = search_archive(
+                categoria=options['categoria'],
+                estado=options['estado'],
+                desde=options['desde'],
+                hasta=options['hasta'],
+                texto=options['texto'],
+            )
+            for row in rows:
+                self.stdout.write(json.dumps(row, ensure_ascii=False))
+        except ValueError as e:
+            raise CommandError(str(e))
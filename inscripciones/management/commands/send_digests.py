@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inscripciones.digests import send_due_digests
+
+
+class Command(BaseCommand):
+    help = 'Encola los resúmenes de inscripciones de las categorías con modo resumen.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Revisar una vez y terminar')
+        parser.add_argument('--interval', type=float, default=60.0, help='Segundos entre revisiones')
+        parser.add_argument('--force', action='store_true', help='Enviar sin esperar el período')
+        parser.add_argument('--categoria', action='append', help='Limitar a estas categorías (clave)')
+
+    def handle(self, *args, **options):
+        while True:
+            queued = send_due_digests(force=options['force'], keys=options['categoria'])
+            if queued:
+                self.stdout.write(f'Resúmenes en cola: {queued}')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('categoria_key', models.CharField(max_length=100)),
+                ('categoria_nombre', models.CharField(max_length=200)),
+                ('solicitante_nombre', models.CharField(max_length=200)),
+                ('solicitante_email', models.CharField(blank=True, default='', max_length=255)),
+                ('one_drive_path', models.CharField(blank=True, default='', max_length=255)),
+                ('one_drive_folder_url', models.CharField(blank=True, default='', max_length=255)),
+                ('archivos', models.JSONField()),
+                ('estado', models.CharField(max_length=50)),
+                ('detalle_error', models.TextField(blank=True, null=True)),
+                ('destinatarios_to', models.JSONField(blank=True, default=list)),
+                ('destinatarios_cc', models.JSONField(blank=True, default=list)),
+                ('user_admin', models.CharField(blank=True, default='', max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Setting',
+            fields=[
+                ('section', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('data', models.JSONField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('base_path', models.CharField(blank=True, default='', max_length=255)),
+                ('notify_emails', models.CharField(blank=True, default='', max_length=255)),
+                ('notify_cc_emails', models.CharField(blank=True, default='', max_length=255)),
+                ('notify_bcc_emails', models.CharField(blank=True, default='', max_length=255)),
+                ('mail_subject_template', models.CharField(blank=True, default='', max_length=255)),
+                ('mail_body_template', models.TextField(blank=True, default='')),
+                ('file_pattern', models.CharField(blank=True, default='', max_length=255)),
+                ('active', models.BooleanField(default=True)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='inscripciones.category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FileField',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('label', models.CharField(max_length=200)),
+                ('description', models.CharField(blank=True, default='', max_length=255)),
+                ('storage_name', models.CharField(blank=True, default='', max_length=255)),
+                ('required', models.BooleanField(default=False)),
+                ('order', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_fields', to='inscripciones.category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Submission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fields', models.JSONField()),
+                ('files', models.JSONField()),
+                ('folder_url', models.CharField(blank=True, default='', max_length=255)),
+                ('status', models.CharField(blank=True, default='', max_length=100)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+                ('user', models.CharField(blank=True, default='', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='inscripciones.category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TextField',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('label', models.CharField(max_length=200)),
+                ('type', models.CharField(default='text', max_length=50)),
+                ('required', models.BooleanField(default=False)),
+                ('order', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='text_fields', to='inscripciones.category')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscripciones', '0002_submission_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filefield',
+            name='allowed_types',
+            field=models.CharField(blank=True, default='', help_text='Tipos MIME separados por coma, ej. application/pdf,image/png', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='filefield',
+            name='max_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscripciones', '0003_filefield_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mailbox', models.CharField(max_length=255)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('to_recipients', models.JSONField(default=list)),
+                ('cc_recipients', models.JSONField(default=list)),
+                ('bcc_recipients', models.JSONField(default=list)),
+                ('status', models.CharField(default='PENDIENTE', max_length=20)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('submission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inscripciones.submission')),
+            ],
+        ),
+    ]
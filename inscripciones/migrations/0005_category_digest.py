@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscripciones', '0004_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='digest_enabled',
+            field=models.BooleanField(default=False, help_text='Enviar un resumen periódico en lugar de un correo por inscripción'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='digest_interval',
+            field=models.PositiveIntegerField(default=60, help_text='Minutos que se acumulan inscripciones antes de enviar el resumen'),
+        ),
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='submissions',
+            field=models.ManyToManyField(blank=True, related_name='digest_messages', to='inscripciones.submission'),
+        ),
+    ]
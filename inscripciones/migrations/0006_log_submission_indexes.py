@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscripciones', '0005_category_digest'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['timestamp', 'id'], name='logentry_ts_id'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['categoria_key', 'timestamp', 'id'], name='logentry_cat_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['estado', 'timestamp', 'id'], name='logentry_estado_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(fields=['status', 'created_at'], name='outbox_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(fields=['mailbox', 'status'], name='outbox_mailbox_status'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['category', 'created_at'], name='submission_cat_created'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['status', 'created_at'], name='submission_status_created'),
+        ),
+    ]
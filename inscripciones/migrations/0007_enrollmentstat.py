@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscripciones', '0006_log_submission_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('categoria_key', models.CharField(max_length=100)),
+                ('estado', models.CharField(max_length=50)),
+                ('entries', models.PositiveIntegerField(default=0)),
+                ('files', models.PositiveIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'categoria_key', 'estado'), name='enrollmentstat_day_cat_estado')],
+            },
+        ),
+    ]
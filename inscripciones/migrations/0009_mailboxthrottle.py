@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscripciones', '0008_logentry_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailboxThrottle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mailbox', models.CharField(max_length=255, unique=True)),
+                ('tat', models.DateTimeField()),
+            ],
+        ),
+    ]
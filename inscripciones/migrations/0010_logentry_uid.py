@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscripciones', '0009_mailboxthrottle'),
+    ]
+
+    # Se agrega sin valor por defecto: uno solo para todas las filas
+    # existentes violaría la restricción única. Esas filas quedan en NULL.
+    operations = [
+        migrations.AddField(
+            model_name='logentry',
+            name='uid',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='logentry',
+            name='uid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+class PostgreSQLRunSQL(migrations.RunSQL):
+    """``RunSQL`` que solo se aplica en PostgreSQL.
+
+    SQLite no tiene índices GIN y ``Meta.indexes`` no permite declararlos
+    por motor.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscripciones', '0010_logentry_uid'),
+    ]
+
+    # IF NOT EXISTS: en las bases anteriores los índices ya se crearon al migrar
+    operations = [
+        PostgreSQLRunSQL(
+            'CREATE INDEX IF NOT EXISTS "submission_fields_gin" '
+            'ON "inscripciones_submission" USING gin ("fields" jsonb_path_ops)',
+            'DROP INDEX IF EXISTS "submission_fields_gin"',
+        ),
+        PostgreSQLRunSQL(
+            'CREATE INDEX IF NOT EXISTS "logentry_archivos_gin" '
+            'ON "inscripciones_logentry" USING gin ("archivos" jsonb_path_ops)',
+            'DROP INDEX IF EXISTS "logentry_archivos_gin"',
+        ),
+    ]
@@ -1,4 +1,10 @@
+import uuid
+
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
+
+from .naming import validate_pattern
 
 
 class Category(models.Model):
@@ -13,10 +19,25 @@ class Category(models.Model):
     file_pattern = models.CharField(max_length=255, blank=True, default='')
     active = models.BooleanField(default=True)
     parent = models.ForeignKey('self', null=True, blank=True, related_name='children', on_delete=models.SET_NULL)
+    # Resumen periódico: una notificación con todas las inscripciones del período
+    digest_enabled = models.BooleanField(
+        default=False,
+        help_text='Enviar un resumen periódico en lugar de un correo por inscripción',
+    )
+    digest_interval = models.PositiveIntegerField(
+        default=60,
+        help_text='Minutos que se acumulan inscripciones antes de enviar el resumen',
+    )
 
     def __str__(self):
         return self.name
 
+    def clean(self):
+        try:
+            validate_pattern(self.file_pattern)
+        except ValidationError as e:
+            raise ValidationError({'file_pattern': e})
+
 
 class FileField(models.Model):
     category = models.ForeignKey(Category, related_name='file_fields', on_delete=models.CASCADE)
@@ -26,6 +47,14 @@ class FileField(models.Model):
     storage_name = models.CharField(max_length=255, blank=True, default='')
     required = models.BooleanField(default=False)
     order = models.IntegerField(default=0)
+    # Límites de carga; vacío usa UPLOAD_MAX_BYTES y las extensiones permitidas
+    max_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    allowed_types = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        help_text='Tipos MIME separados por coma, ej. application/pdf,image/png',
+    )
 
 
 class TextField(models.Model):
@@ -46,15 +75,64 @@ class Submission(models.Model):
     category = models.ForeignKey(Category, null=True, on_delete=models.SET_NULL)
     fields = models.JSONField()
     files = models.JSONField()
+    dest_path = models.CharField(max_length=255, blank=True, default='')
     folder_url = models.CharField(max_length=255, blank=True, default='')
     status = models.CharField(max_length=100, blank=True, default='')
     error = models.CharField(max_length=255, blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
     user = models.CharField(max_length=100, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'created_at'], name='submission_cat_created'),
+            models.Index(fields=['status', 'created_at'], name='submission_status_created'),
+        ]
+
+
+class OutboxMessage(models.Model):
+    """Correo ya renderizado pendiente de envío por Microsoft Graph."""
+
+    submission = models.ForeignKey(Submission, null=True, blank=True, on_delete=models.SET_NULL)
+    # Inscripciones incluidas en un resumen (modo digest)
+    submissions = models.ManyToManyField(Submission, blank=True, related_name='digest_messages')
+    mailbox = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    to_recipients = models.JSONField(default=list)
+    cc_recipients = models.JSONField(default=list)
+    bcc_recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=20, default='PENDIENTE')
+    error = models.CharField(max_length=255, blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='outbox_status_created'),
+            models.Index(fields=['mailbox', 'status'], name='outbox_mailbox_status'),
+        ]
+
+
+class MailboxThrottle(models.Model):
+    """Estado compartido del límite de envíos de un buzón (ver ``outbox.reserve_send``).
+
+    ``tat`` es el momento en que el buzón recupera todos sus envíos
+    disponibles si no se reserva ninguno más.
+    """
+
+    mailbox = models.CharField(max_length=255, unique=True)
+    tat = models.DateTimeField()
+
 
 class LogEntry(models.Model):
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Se fija al registrar el evento, no al insertar (ver ``logbuffer``)
+    timestamp = models.DateTimeField(default=timezone.now)
     categoria_key = models.CharField(max_length=100)
     categoria_nombre = models.CharField(max_length=200)
     solicitante_nombre = models.CharField(max_length=200)
@@ -67,3 +145,34 @@ class LogEntry(models.Model):
     destinatarios_to = models.JSONField(default=list, blank=True)
     destinatarios_cc = models.JSONField(default=list, blank=True)
     user_admin = models.CharField(max_length=100, blank=True, default='')
+    # Identifica el evento para no insertarlo dos veces al recuperar un
+    # diario (ver ``logbuffer``); vacío en registros anteriores
+    uid = models.UUIDField(default=uuid.uuid4, editable=False, null=True, unique=True)
+
+    class Meta:
+        indexes = [
+            # Navegación por keyset: orden (timestamp, id) con filtros opcionales
+            models.Index(fields=['timestamp', 'id'], name='logentry_ts_id'),
+            models.Index(fields=['categoria_key', 'timestamp', 'id'], name='logentry_cat_ts'),
+            models.Index(fields=['estado', 'timestamp', 'id'], name='logentry_estado_ts'),
+        ]
+
+
+class EnrollmentStat(models.Model):
+    """Totales diarios del registro por categoría y estado.
+
+    Se actualiza al guardar cada ``LogEntry`` y puede reconstruirse con
+    ``rebuild_stats``; los reportes leen solo esta tabla.
+    """
+
+    day = models.DateField()
+    categoria_key = models.CharField(max_length=100)
+    estado = models.CharField(max_length=50)
+    entries = models.PositiveIntegerField(default=0)
+    files = models.PositiveIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'categoria_key', 'estado'], name='enrollmentstat_day_cat_estado'),
+        ]
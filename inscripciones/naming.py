@@ -0,0 +1,114 @@
+"""Nombres finales de los archivos según ``Category.file_pattern``.
+
+El patrón se analiza una sola vez y se guarda compilado junto a la
+categoría; al nombrar cada archivo solo se concatenan sus partes.
+"""
+import re
+import uuid
+from datetime import datetime
+from functools import lru_cache
+
+from django.core.exceptions import ValidationError
+
+PLACEHOLDER = re.compile(r'{([a-z]+)(?::([^{}]*))?}')
+PLACEHOLDERS = ('categoria', 'nombre', 'label', 'fecha', 'uuid')
+DEFAULT_DATE_FORMAT = '%Y%m%d'
+# Caracteres no válidos en nombres de OneDrive
+INVALID_CHARS = str.maketrans({c: '_' for c in '\\/:*?"<>|'})
+MAX_STEM_LENGTH = 120
+
+
+def sanitize(value: str) -> str:
+    return value.translate(INVALID_CHARS)
+
+
+def validate_pattern(pattern: str) -> None:
+    """Lanza ``ValidationError`` si el patrón no puede compilarse."""
+    for match in PLACEHOLDER.finditer(pattern):
+        name, fmt = match.groups()
+        if name not in PLACEHOLDERS:
+            raise ValidationError(
+                'Variable desconocida {%(name)s}; use %(allowed)s',
+                params={'name': name, 'allowed': ', '.join(f'{{{p}}}' for p in PLACEHOLDERS)},
+            )
+        if fmt is not None and name != 'fecha':
+            raise ValidationError('Solo {fecha} admite formato, p. ej. {fecha:%Y-%m-%d}')
+        if fmt is not None:
+            try:
+                datetime(2000, 1, 1).strftime(fmt)
+            except ValueError as e:
+                raise ValidationError(f'Formato de fecha no válido: {e}')
+    rest = PLACEHOLDER.sub('', pattern)
+    if '{' in rest or '}' in rest:
+        raise ValidationError('Llaves sin cerrar en el patrón de nombres')
+
+
+class FileNamer:
+    """Patrón de nombres compilado en segmentos literales y variables."""
+
+    __slots__ = ('pattern', 'segments')
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        segments = []
+        pos = 0
+        for match in PLACEHOLDER.finditer(pattern):
+            name, fmt = match.groups()
+            if name not in PLACEHOLDERS:
+                # Se conserva como texto, igual que antes de compilar
+                continue
+            if match.start() > pos:
+                segments.append((None, sanitize(pattern[pos:match.start()])))
+            if name == 'fecha':
+                segments.append((name, fmt or DEFAULT_DATE_FORMAT))
+            else:
+                segments.append((name, None))
+            pos = match.end()
+        if pos < len(pattern):
+            segments.append((None, sanitize(pattern[pos:])))
+        self.segments = tuple(segments)
+
+    def stem(self, *, categoria: str, nombre: str, label: str, storage_name: str,
+             original: str, now: datetime) -> str:
+        """Nombre del archivo sin extensión.
+
+        Sin patrón se usa el nombre final configurado o el nombre original.
+        """
+        if not self.pattern:
+            return sanitize(storage_name or original)
+        values = {
+            'categoria': categoria,
+            'nombre': nombre,
+            'label': storage_name or label,
+        }
+        parts = []
+        for name, value in self.segments:
+            if name is None:
+                parts.append(value)
+            elif name == 'fecha':
+                parts.append(sanitize(now.strftime(value)))
+            elif name == 'uuid':
+                parts.append(uuid.uuid4().hex[:8])
+            else:
+                parts.append(sanitize(values[name]))
+        return ''.join(parts)[:MAX_STEM_LENGTH]
+
+
+@lru_cache(maxsize=None)
+def compile_pattern(pattern: str) -> FileNamer:
+    return FileNamer(pattern or '')
+
+
+def unique_name(stem: str, ext: str, used: set) -> str:
+    """Agrega ``-2``, ``-3``... hasta que el nombre no esté en ``used``.
+
+    La comparación ignora mayúsculas, como OneDrive. El nombre elegido se
+    agrega a ``used``.
+    """
+    name = f'{stem}{ext}'
+    n = 2
+    while name.lower() in used:
+        name = f'{stem}-{n}{ext}'
+        n += 1
+    used.add(name.lower())
+    return name
@@ -0,0 +1,195 @@
+"""Cola de salida de las notificaciones por correo.
+
+El worker renderiza cada notificación y la guarda como ``OutboxMessage``.
+``drain_outbox`` las envía por Microsoft Graph respetando un límite de
+envíos por buzón, compartido entre procesos (token bucket), y ante un 429
+pausa todo el buzón el tiempo indicado en ``Retry-After``. El resultado
+final se registra en la ``Submission`` y en ``LogEntry``.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from services.graph_auth import GraphAPIError, get_access_token
+from services.mail import send_mail_custom
+
+from .models import MailboxThrottle, OutboxMessage
+from .utils import load_settings
+
+logger = logging.getLogger(__name__)
+
+# Estados de OutboxMessage
+PENDIENTE = 'PENDIENTE'
+ENVIADO = 'ENVIADO'
+ERROR = 'ERROR'
+
+MAX_ATTEMPTS = 8
+RETRY_DELAY = timedelta(seconds=30)
+MAX_RETRY_DELAY = timedelta(minutes=30)
+LOCK_TIMEOUT = timedelta(minutes=5)
+# Respuestas de Graph que indican saturación del buzón, no un error del mensaje
+THROTTLE_STATUSES = (429, 503, 504)
+# Espera usada cuando Graph limita sin indicar Retry-After
+DEFAULT_THROTTLE_DELAY = 60.0
+
+
+def reserve_send(mailbox: str) -> float:
+    """Reserva un envío del buzón y devuelve los segundos a esperar antes de hacerlo.
+
+    Es un token bucket de ``OUTBOX_BURST`` envíos que se recarga a
+    ``OUTBOX_RATE_PER_MINUTE`` (algoritmo GCRA), guardado en una fila de
+    ``MailboxThrottle`` para que el límite sea el mismo con varios procesos.
+    """
+    rate = getattr(settings, 'OUTBOX_RATE_PER_MINUTE', 30)
+    interval = timedelta(seconds=60 / rate)
+    tolerance = interval * (max(1, getattr(settings, 'OUTBOX_BURST', 10)) - 1)
+    key = mailbox.lower()
+    while True:
+        now = timezone.now()
+        row, _ = MailboxThrottle.objects.get_or_create(mailbox=key, defaults={'tat': now})
+        tat = max(row.tat, now)
+        # Actualización condicional: si otro proceso reservó antes se repite
+        # el cálculo con el valor nuevo
+        if MailboxThrottle.objects.filter(pk=row.pk, tat=row.tat).update(tat=tat + interval):
+            return max(0.0, (tat - now - tolerance).total_seconds())
+
+
+def queue_message(submission, mailbox, subject, body, to, cc=None, bcc=None) -> OutboxMessage:
+    return OutboxMessage.objects.create(
+        submission=submission,
+        mailbox=mailbox,
+        subject=subject[:255],
+        body=body,
+        to_recipients=list(to),
+        cc_recipients=list(cc or []),
+        bcc_recipients=list(bcc or []),
+        status=PENDIENTE,
+    )
+
+
+def claim_message() -> OutboxMessage | None:
+    """Toma el siguiente correo pendiente bloqueando su fila."""
+    now = timezone.now()
+    with transaction.atomic():
+        msg = (
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status=PENDIENTE)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .filter(Q(locked_at__isnull=True) | Q(locked_at__lt=now - LOCK_TIMEOUT))
+            .order_by('created_at')
+            .first()
+        )
+        if msg is None:
+            return None
+        claimed = OutboxMessage.objects.filter(pk=msg.pk, locked_at=msg.locked_at).update(locked_at=now)
+        if not claimed:
+            return None
+    msg.locked_at = now
+    return msg
+
+
+def pause_mailbox(mailbox: str, seconds: float) -> None:
+    """Posterga todos los correos pendientes del buzón (visible para todos los procesos)."""
+    until = timezone.now() + timedelta(seconds=seconds)
+    # Igual que reserve_send, el buzón no distingue mayúsculas
+    OutboxMessage.objects.filter(mailbox__iexact=mailbox, status=PENDIENTE).filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lt=until)
+    ).update(next_attempt_at=until)
+
+
+def _release_if_paused(msg: OutboxMessage) -> bool:
+    """Libera ``msg`` si su buzón se pausó después de tomarlo."""
+    msg.refresh_from_db(fields=['next_attempt_at'])
+    if msg.next_attempt_at is None or msg.next_attempt_at <= timezone.now():
+        return False
+    OutboxMessage.objects.filter(pk=msg.pk, locked_at=msg.locked_at).update(locked_at=None)
+    return True
+
+
+def _finish(msg: OutboxMessage, estado: str, detalle: str = '') -> None:
+    # Import diferido para evitar el ciclo con jobs, que encola mensajes aquí
+    from .jobs import ENVIADO as SUB_ENVIADO, ERROR_MAIL, _log_submission
+
+    subs = [msg.submission] if msg.submission else list(msg.submissions.all())
+    for sub in subs:
+        sub.status = SUB_ENVIADO if estado == ENVIADO else ERROR_MAIL
+        sub.error = detalle[:255]
+        sub.save(update_fields=['status', 'error'])
+        _log_submission(sub, sub.status, detalle)
+
+
+def deliver(msg: OutboxMessage) -> None:
+    """Envía ``msg`` y actualiza su estado, programando reintentos si falla."""
+    drive_cfg = load_settings().get('onedrive', {})
+    try:
+        token = get_access_token(drive_cfg)
+        send_mail_custom(
+            token,
+            msg.mailbox,
+            msg.subject,
+            msg.body,
+            msg.to_recipients,
+            msg.cc_recipients,
+            msg.bcc_recipients,
+            max_retries=0,
+        )
+    except GraphAPIError as e:
+        msg.locked_at = None
+        msg.error = str(e)[:255]
+        if e.status_code in THROTTLE_STATUSES:
+            delay = e.retry_after or DEFAULT_THROTTLE_DELAY
+            logger.warning("Buzón %s limitado por Graph, pausa de %.0fs", msg.mailbox, delay)
+            msg.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+            msg.save(update_fields=['locked_at', 'error', 'next_attempt_at'])
+            pause_mailbox(msg.mailbox, delay)
+            return
+        _retry_or_fail(msg, e)
+        return
+    except Exception as e:
+        msg.locked_at = None
+        msg.error = str(e)[:255]
+        _retry_or_fail(msg, e)
+        return
+    msg.status = ENVIADO
+    msg.sent_at = timezone.now()
+    msg.locked_at = None
+    msg.error = ''
+    msg.save(update_fields=['status', 'sent_at', 'locked_at', 'error'])
+    _finish(msg, ENVIADO)
+
+
+def _retry_or_fail(msg: OutboxMessage, error: Exception) -> None:
+    msg.attempts += 1
+    if msg.attempts >= MAX_ATTEMPTS:
+        logger.error("Correo %s falló definitivamente: %s", msg.pk, error)
+        msg.status = ERROR
+        msg.save(update_fields=['attempts', 'error', 'locked_at', 'status'])
+        _finish(msg, ERROR, str(error))
+        return
+    delay = min(MAX_RETRY_DELAY, RETRY_DELAY * (2 ** (msg.attempts - 1)))
+    logger.warning("Correo %s falló (intento %s), reintento en %s: %s", msg.pk, msg.attempts, delay, error)
+    msg.next_attempt_at = timezone.now() + delay
+    msg.save(update_fields=['attempts', 'error', 'locked_at', 'next_attempt_at'])
+
+
+def drain_outbox(limit: int | None = None) -> int:
+    """Envía correos pendientes respetando el límite de cada buzón."""
+    done = 0
+    while limit is None or done < limit:
+        msg = claim_message()
+        if msg is None:
+            break
+        wait = reserve_send(msg.mailbox)
+        if wait:
+            time.sleep(wait)
+        # Otro proceso pudo recibir un 429 del buzón mientras se esperaba
+        if _release_if_paused(msg):
+            continue
+        deliver(msg)
+        done += 1
+    return done
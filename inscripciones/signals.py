@@ -0,0 +1,21 @@
+"""Invalidación de la configuración en memoria al modificar el panel."""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import Category, FileField, Setting, TextField
+from .utils import bump_config_version
+
+CONFIG_MODELS = (Category, FileField, TextField, Setting)
+
+
+def config_changed(sender, **kwargs):
+    # Tras el commit, para que otro proceso no guarde datos anteriores
+    # bajo la nueva versión
+    transaction.on_commit(bump_config_version)
+
+
+def connect_signals() -> None:
+    for model in CONFIG_MODELS:
+        uid = f'inscripciones-config-{model.__name__}'
+        post_save.connect(config_changed, sender=model, dispatch_uid=uid + '-save')
+        post_delete.connect(config_changed, sender=model, dispatch_uid=uid + '-delete')
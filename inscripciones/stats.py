@@ -0,0 +1,151 @@
+"""Totales por día, categoría y estado (``EnrollmentStat``).
+
+Cada registro guardado suma uno a su fila del día junto con la cantidad y
+el tamaño de sus archivos, de modo que el tablero no recorre ``LogEntry``
+ni interpreta el JSON de ``archivos``.
+"""
+from datetime import datetime
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Min, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .archive import search_archive
+from .models import EnrollmentStat, LogEntry
+
+# Ids consultados por sentencia al descartar filas archivadas que siguen en
+# la tabla (límite de variables de SQLite)
+ID_QUERY_SIZE = 500
+
+
+def _file_totals(archivos) -> tuple[int, int]:
+    archivos = archivos or []
+    return len(archivos), sum(a.get('size_bytes') or 0 for a in archivos)
+
+
+def rollup(rows) -> dict[tuple, list[int]]:
+    """Agrupa ``(timestamp, categoria_key, estado, archivos)`` por día.
+
+    Devuelve ``{(día, categoría, estado): [registros, archivos, bytes]}``.
+    """
+    totals: dict[tuple, list[int]] = {}
+    for timestamp, categoria_key, estado, archivos in rows:
+        key = (timezone.localdate(timestamp), categoria_key, estado)
+        files, size = _file_totals(archivos)
+        acc = totals.setdefault(key, [0, 0, 0])
+        acc[0] += 1
+        acc[1] += files
+        acc[2] += size
+    return totals
+
+
+def _add(key: tuple, entries: int, files: int, size: int) -> None:
+    day, categoria_key, estado = key
+    filters = {'day': day, 'categoria_key': categoria_key, 'estado': estado}
+    increments = {'entries': F('entries') + entries, 'files': F('files') + files, 'bytes': F('bytes') + size}
+    if EnrollmentStat.objects.filter(**filters).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            EnrollmentStat.objects.create(**filters, entries=entries, files=files, bytes=size)
+    except IntegrityError:
+        # Otro proceso creó la fila entre la actualización y el alta
+        EnrollmentStat.objects.filter(**filters).update(**increments)
+
+
+def record_entries(entries) -> None:
+    """Suma a los totales los ``LogEntry`` recién guardados."""
+    totals = rollup((e.timestamp, e.categoria_key, e.estado, e.archivos) for e in entries)
+    for key, (count, files, size) in totals.items():
+        _add(key, count, files, size)
+
+
+def _not_in_table(rows: list[tuple]) -> list[tuple]:
+    live = set(LogEntry.objects.filter(pk__in=[pk for pk, _ in rows]).values_list('pk', flat=True))
+    return [row for pk, row in rows if pk not in live]
+
+
+def _archived_rows():
+    """Filas del archivo histórico que ya no están en ``LogEntry``.
+
+    Un lote que ``archive_logs`` escribió pero todavía no borró está en los
+    dos lugares; esas filas se cuentan solo desde la tabla. Solo pueden
+    repetirse las filas tan nuevas como el registro más antiguo de la tabla,
+    así que solo esas se consultan.
+    """
+    oldest = LogEntry.objects.aggregate(oldest=Min('timestamp'))['oldest']
+    pending = []
+    for row in search_archive():
+        timestamp = datetime.fromisoformat(row['timestamp'])
+        item = (timestamp, row['categoria_key'], row['estado'], row['archivos'])
+        if oldest is None or timestamp < oldest:
+            yield item
+            continue
+        pending.append((row['id'], item))
+        if len(pending) >= ID_QUERY_SIZE:
+            yield from _not_in_table(pending)
+            pending = []
+    if pending:
+        yield from _not_in_table(pending)
+
+
+def _lock_log_entries() -> None:
+    """Impide altas y bajas en ``LogEntry`` hasta el fin de la transacción."""
+    if connection.vendor == 'postgresql':
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {qn(LogEntry._meta.db_table)} IN SHARE MODE')
+
+
+def rebuild_stats(include_archive: bool = True) -> int:
+    """Recalcula todos los totales desde ``LogEntry`` y el archivo histórico.
+
+    El recálculo y el reemplazo de la tabla se hacen en una transacción que
+    bloquea las escrituras en ``LogEntry``: un registro guardado durante el
+    recálculo espera y se suma después, y ``archive_logs`` no puede borrar
+    un lote a medias. En SQLite el bloqueo es de toda la base, así que con
+    muchos registros conviene detener los workers mientras se recalcula.
+    Devuelve la cantidad de filas generadas.
+    """
+    with transaction.atomic():
+        _lock_log_entries()
+        # En SQLite la primera escritura toma el bloqueo de la base
+        EnrollmentStat.objects.all().delete()
+        rows = LogEntry.objects.values_list('timestamp', 'categoria_key', 'estado', 'archivos')
+        totals = rollup(rows.iterator(chunk_size=2000))
+        if include_archive:
+            for key, (count, files, size) in rollup(_archived_rows()).items():
+                acc = totals.setdefault(key, [0, 0, 0])
+                acc[0] += count
+                acc[1] += files
+                acc[2] += size
+        stats = [
+            EnrollmentStat(day=day, categoria_key=cat, estado=estado, entries=count, files=files, bytes=size)
+            for (day, cat, estado), (count, files, size) in totals.items()
+        ]
+        EnrollmentStat.objects.bulk_create(stats, batch_size=1000)
+    return len(stats)
+
+
+def stats_summary(categoria: str = '', desde: str = '', hasta: str = '') -> dict:
+    """Filas diarias y totales por categoría y estado del rango indicado.
+
+    Lanza ``ValueError`` si alguna fecha no tiene formato ``AAAA-MM-DD``.
+    """
+    qs = EnrollmentStat.objects.all()
+    if categoria:
+        qs = qs.filter(categoria_key=categoria)
+    for lookup, value in (('day__gte', desde), ('day__lte', hasta)):
+        if value:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f'Fecha inválida: {value}')
+            qs = qs.filter(**{lookup: day})
+    sums = {'entries': Sum('entries'), 'files': Sum('files'), 'bytes': Sum('bytes')}
+    return {
+        'days': list(qs.order_by('-day', 'categoria_key', 'estado')),
+        'by_category': list(qs.values('categoria_key').annotate(**sums).order_by('categoria_key')),
+        'by_estado': list(qs.values('estado').annotate(**sums).order_by('estado')),
+        'total': qs.aggregate(**sums),
+    }
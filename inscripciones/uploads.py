@@ -0,0 +1,228 @@
+"""Manejadores de carga de archivos para el formulario de inscripción."""
+import io
+import json
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers, StopUpload
+
+from services.graph_auth import GraphAPIError, get_access_token
+from services.onedrive import (
+    UPLOAD_CHUNK_SIZE,
+    cancel_upload_session,
+    create_upload_session,
+    delete_item,
+    ensure_folder,
+    put_chunk,
+)
+
+from .utils import load_settings
+
+logger = logging.getLogger(__name__)
+
+# Encabezado enviado por form.html con el tamaño de cada archivo: {"campo": bytes}
+SIZES_HEADER = 'HTTP_X_UPLOAD_SIZES'
+
+FILE_SIGNATURES = (
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+)
+EXTENSION_TYPES = {
+    '.pdf': 'application/pdf',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+}
+SNIFF_BYTES = max(len(sig) for sig, _ in FILE_SIGNATURES)
+
+
+def sniff_content_type(head: bytes) -> str | None:
+    """Devuelve el tipo MIME según la firma inicial del archivo."""
+    for signature, content_type in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def field_max_bytes(fcfg: dict) -> int:
+    return fcfg.get('max_bytes') or getattr(settings, 'UPLOAD_MAX_BYTES', 20 * 1024 * 1024)
+
+
+class ValidatingUploadHandler(FileUploadHandler):
+    """Valida cada archivo mientras se recibe y corta la carga al fallar.
+
+    Revisa la extensión y el tipo permitido al iniciar el archivo, compara
+    la firma de los primeros bytes con la extensión y cuenta los bytes
+    recibidos contra el límite del campo. Los errores quedan en
+    ``request.upload_errors``. Debe ser el primer manejador de la lista.
+    """
+
+    def __init__(self, request, files_cfg):
+        super().__init__(request)
+        self.fields = {f['name']: f for f in files_cfg}
+        self.allowed_exts = [e.lower() for e in getattr(settings, 'UPLOAD_EXTENSIONS', [])]
+        request.upload_errors = []
+
+    def _reject(self, message: str):
+        logger.warning("Carga rechazada: %s", message)
+        self.request.upload_errors.append(message)
+        raise StopUpload(connection_reset=True)
+
+    def new_file(self, field_name, file_name, content_type, content_length, *args, **kwargs):
+        super().new_file(field_name, file_name, content_type, content_length, *args, **kwargs)
+        fcfg = self.fields.get(field_name)
+        if fcfg is None:
+            self._reject(f'Archivo no esperado: {file_name}')
+        ext = os.path.splitext(file_name)[1].lower()
+        if ext not in self.allowed_exts:
+            self._reject(f'Archivo no permitido: {file_name}')
+        self.expected_type = EXTENSION_TYPES.get(ext)
+        allowed_types = fcfg.get('allowed_types') or []
+        if allowed_types and self.expected_type not in allowed_types:
+            self._reject(f"Tipo de archivo no permitido para {fcfg['label']}: {file_name}")
+        self.label = fcfg['label']
+        self.max_bytes = field_max_bytes(fcfg)
+        if content_length and content_length > self.max_bytes:
+            self._reject(f'El archivo {self.label} excede el tamaño máximo ({self.max_bytes} bytes)')
+        self.received = 0
+        self.head = b''
+        self.sniffed = False
+
+    def _check_signature(self):
+        self.sniffed = True
+        detected = sniff_content_type(self.head)
+        if self.expected_type and detected != self.expected_type:
+            self._reject(f'El contenido de {self.file_name} no corresponde a su extensión')
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self._reject(f'El archivo {self.label} excede el tamaño máximo ({self.max_bytes} bytes)')
+        if not self.sniffed:
+            self.head += raw_data[: SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self._check_signature()
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not self.sniffed:
+            self._check_signature()
+        return None
+
+
+class StagedUploadedFile(UploadedFile):
+    """Archivo recibido directamente en la carpeta de staging de OneDrive."""
+
+    def __init__(self, name, size, content_type, charset, item_id):
+        super().__init__(io.BytesIO(), name, content_type, size, charset)
+        self.item_id = item_id
+
+
+class GraphStreamingUploadHandler(FileUploadHandler):
+    """Reenvía cada archivo a una sesión de carga de Graph mientras llega.
+
+    Solo se conserva en memoria la parte en curso (``UPLOAD_CHUNK_SIZE``).
+    Los archivos quedan en ``ONEDRIVE_STAGING_PATH`` y el worker los mueve a
+    la carpeta definitiva. Si el navegador no informó el tamaño del archivo
+    o Graph no está disponible, el archivo pasa a los manejadores por
+    defecto de Django.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        try:
+            self.sizes = json.loads(request.META.get(SIZES_HEADER, '') or '{}')
+        except ValueError:
+            self.sizes = {}
+        self.upload_url = None
+        self.staged = []
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.upload_url = None
+        try:
+            self.size = int(self.sizes.get(field_name) or 0)
+        except (TypeError, ValueError):
+            self.size = 0
+        if not self.size or not file_name:
+            return
+        drive_cfg = load_settings().get('onedrive', {})
+        self.user_id = drive_cfg.get('user_id', '')
+        try:
+            self.token = get_access_token(drive_cfg)
+            staging = getattr(settings, 'ONEDRIVE_STAGING_PATH', '_staging')
+            folder = ensure_folder(self.token, self.user_id, staging)
+            staged_name = f"{uuid.uuid4().hex}{os.path.splitext(file_name)[1].lower()}"
+            self.upload_url = create_upload_session(self.token, self.user_id, folder['id'], staged_name)
+        except GraphAPIError:
+            logger.exception("No se pudo iniciar la carga directa de %s", file_name)
+            return
+        self.offset = 0
+        self.buffer = bytearray()
+        self.item = None
+        raise StopFutureHandlers()
+
+    def _send(self, length: int) -> None:
+        chunk = bytes(self.buffer[:length])
+        try:
+            self.item, next_offset = put_chunk(self.upload_url, chunk, self.offset, self.size)
+        except GraphAPIError:
+            logger.exception("Error enviando parte de %s a OneDrive", self.file_name)
+            self._abort()
+        if next_offset != self.offset + length:
+            logger.error("OneDrive esperaba el byte %s de %s", next_offset, self.file_name)
+            self._abort()
+        del self.buffer[:length]
+        self.offset = next_offset
+
+    def _abort(self):
+        cancel_upload_session(self.upload_url)
+        self.upload_url = None
+        raise StopUpload(connection_reset=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.upload_url:
+            return raw_data
+        self.buffer += raw_data
+        if self.offset + len(self.buffer) > self.size:
+            logger.error("El archivo %s excede el tamaño declarado", self.file_name)
+            self._abort()
+        while len(self.buffer) >= UPLOAD_CHUNK_SIZE:
+            self._send(UPLOAD_CHUNK_SIZE)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.upload_url:
+            return None
+        if file_size != self.size:
+            logger.error("Tamaño de %s distinto al declarado", self.file_name)
+            self._abort()
+        if self.buffer:
+            self._send(len(self.buffer))
+        self.upload_url = None
+        self.staged.append(self.item['id'])
+        return StagedUploadedFile(
+            self.file_name, file_size, self.content_type, self.charset, self.item['id']
+        )
+
+    def upload_interrupted(self):
+        if self.upload_url:
+            cancel_upload_session(self.upload_url)
+            self.upload_url = None
+
+    def upload_complete(self):
+        # Tras un StopUpload Django no llama upload_interrupted
+        self.upload_interrupted()
+
+    def discard(self) -> None:
+        """Elimina de OneDrive los archivos recibidos (p. ej. si el formulario no es válido)."""
+        for item_id in self.staged:
+            try:
+                delete_item(self.token, self.user_id, item_id)
+            except GraphAPIError:
+                logger.warning("No se pudo eliminar el archivo temporal %s", item_id)
+        self.staged = []
@@ -4,4 +4,6 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('inscripcion/<str:key>/', views.inscripcion, name='inscripcion'),
+    path('inscripcion/<str:key>/sesion/', views.inscripcion_sesion, name='inscripcion_sesion'),
+    path('inscripcion/<str:key>/finalizar/', views.inscripcion_finalizar, name='inscripcion_finalizar'),
 ]
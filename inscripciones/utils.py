@@ -1,14 +1,216 @@
-from typing import Dict, Any, List
+import copy
+import threading
+import uuid
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, List, Mapping, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch, QuerySet
+from django.utils import timezone
+
 from .models import Category, FileField, TextField, Setting, LogEntry
+from .logbuffer import get_log_buffer
+from .naming import compile_pattern
+from .stats import record_entries
 
+# Versión de la configuración compartida entre procesos a través del cache de
+# Django. Las señales de ``signals.py`` la cambian al modificar categorías,
+# campos o ajustes; cada proceso reconstruye su copia local al notar el cambio.
+CONFIG_VERSION_KEY = 'inscripciones:config-version'
 
-def load_menu(include_inactive: bool = False) -> List[Dict[str, Any]]:
-    qs = Category.objects.all()
-    if not include_inactive:
-        qs = qs.filter(active=True)
-    result = []
-    for c in qs.select_related('parent'):
-        result.append({
+_config_lock = threading.Lock()
+_config_snapshot: Dict[str, Any] = {'version': None}
+
+SETTINGS_DEFAULTS = {
+    'mail': {
+        'mail_user': '',
+        'mail_password': '',
+        'smtp_host': 'smtp.office365.com',
+        'smtp_port': 587,
+        'tested': False,
+        'updated_at': '',
+        'tested_at': '',
+    },
+    'onedrive': {
+        'client_id': '',
+        'client_secret': '',
+        'tenant_id': '',
+        'user_id': '',
+        'upload_concurrency': 4,
+        'tested': False,
+        'updated_at': '',
+        'tested_at': '',
+    },
+}
+
+
+# Ajustes que una subcategoría hereda del ancestro más cercano que los define
+INHERITED_FIELDS = (
+    'base_path',
+    'notify_emails',
+    'notify_cc_emails',
+    'notify_bcc_emails',
+    'mail_subject_template',
+    'mail_body_template',
+    'file_pattern',
+)
+
+
+class CategoryTree:
+    """Árbol de categorías indexado por clave y por id.
+
+    Cada nodo es el diccionario de ``load_menu`` con los ajustes heredados ya
+    resueltos, más ``ancestors`` (claves desde la raíz), ``children`` (claves
+    de las subcategorías), ``depth`` y ``file_namer`` (el patrón de nombres
+    compilado). Los valores propios de la categoría quedan en ``own``. El
+    árbol se comparte entre peticiones: no debe modificarse.
+    """
+
+    def __init__(self, nodes: List[Dict[str, Any]]):
+        self.nodes = nodes
+        self.by_key = {n['key']: n for n in nodes}
+        self.by_id = {n['id']: n for n in nodes}
+        for n in nodes:
+            n['children'] = []
+        for n in nodes:
+            parent = self.by_id.get(n['parent_id'])
+            if parent is not None:
+                parent['children'].append(n['key'])
+        for n in nodes:
+            n['own'] = {f: n[f] for f in INHERITED_FIELDS}
+        for n in nodes:
+            self._resolve(n)
+
+    def _resolve(self, node: Dict[str, Any]) -> None:
+        # Recorrer hacia la raíz; ``seen`` corta ciclos en los datos
+        chain = []
+        seen = {node['id']}
+        parent = self.by_id.get(node['parent_id'])
+        while parent is not None and parent['id'] not in seen:
+            chain.append(parent)
+            seen.add(parent['id'])
+            parent = self.by_id.get(parent['parent_id'])
+        node['ancestors'] = [a['key'] for a in reversed(chain)]
+        node['depth'] = len(chain)
+        for f in INHERITED_FIELDS:
+            if str(node['own'][f]).strip():
+                continue
+            for a in chain:
+                if str(a['own'][f]).strip():
+                    node[f] = a['own'][f]
+                    break
+        node['file_namer'] = compile_pattern(node['file_pattern'])
+
+    def get(self, key: str, include_inactive: bool = False) -> Dict[str, Any] | None:
+        node = self.by_key.get(key)
+        if node is None or not (include_inactive or node['active']):
+            return None
+        return node
+
+    def get_by_id(self, category_id: int) -> Dict[str, Any] | None:
+        return self.by_id.get(category_id)
+
+    def children(self, key: str, include_inactive: bool = False) -> List[Dict[str, Any]]:
+        node = self.by_key.get(key)
+        if node is None:
+            return []
+        result = [self.by_key[k] for k in node['children']]
+        return result if include_inactive else [c for c in result if c['active']]
+
+    def roots(self, include_inactive: bool = False) -> List[Dict[str, Any]]:
+        return [
+            n for n in self.nodes
+            if not n['parent'] and (include_inactive or n['active'])
+        ]
+
+    def ancestors(self, key: str) -> List[Dict[str, Any]]:
+        node = self.by_key.get(key)
+        return [self.by_key[k] for k in node['ancestors']] if node else []
+
+
+@dataclass(frozen=True)
+class FormSchema:
+    """Campos del formulario de una categoría, en orden y de solo lectura."""
+
+    key: str
+    name: str
+    file_fields: Tuple[Mapping[str, Any], ...]
+    text_fields: Tuple[Mapping[str, Any], ...]
+
+
+def _schema_queryset():
+    return Category.objects.select_related('parent').prefetch_related(
+        Prefetch('file_fields', queryset=FileField.objects.order_by('order')),
+        Prefetch('text_fields', queryset=TextField.objects.order_by('order')),
+    )
+
+
+def _schema_from_category(c: Category) -> FormSchema:
+    return FormSchema(
+        key=c.key,
+        name=c.name,
+        file_fields=tuple(
+            MappingProxyType({
+                'name': f.name,
+                'label': f.label,
+                'description': f.description,
+                'required': f.required,
+                'storage_name': f.storage_name,
+                'max_bytes': f.max_bytes,
+                'allowed_types': tuple(t.strip() for t in f.allowed_types.split(',') if t.strip()),
+            })
+            for f in c.file_fields.all()
+        ),
+        text_fields=tuple(
+            MappingProxyType({
+                'name': f.name,
+                'label': f.label,
+                'type': f.type,
+                'required': f.required,
+            })
+            for f in c.text_fields.all()
+        ),
+    )
+
+
+def build_form_schemas(categories: Iterable[Category] | None = None) -> Dict[str, FormSchema]:
+    """Construye los esquemas leyendo la base de datos en una sola pasada.
+
+    Acepta un queryset de categorías (p. ej. la selección de una acción del
+    admin); sin argumento usa todas. Cuesta tres consultas sin importar la
+    cantidad de categorías.
+    """
+    qs = _schema_queryset()
+    if categories is not None:
+        if isinstance(categories, QuerySet):
+            qs = qs.filter(pk__in=categories.values('pk'))
+        else:
+            qs = qs.filter(pk__in=[c.pk for c in categories])
+    return {c.key: _schema_from_category(c) for c in qs}
+
+
+def bump_config_version() -> None:
+    """Invalida la configuración en memoria de todos los procesos."""
+    cache.set(CONFIG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def _config_version() -> str:
+    version = cache.get(CONFIG_VERSION_KEY)
+    if version is None:
+        cache.add(CONFIG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CONFIG_VERSION_KEY)
+    return version
+
+
+def _build_config() -> Dict[str, Any]:
+    menu = []
+    schemas = {}
+    for c in _schema_queryset():
+        schemas[c.key] = _schema_from_category(c)
+        menu.append({
             'id': c.id,
             'key': c.key,
             'name': c.name,
@@ -22,72 +224,86 @@ def load_menu(include_inactive: bool = False) -> List[Dict[str, Any]]:
             'mail_body_template': c.mail_body_template,
             'file_pattern': c.file_pattern,
             'active': c.active,
+            'digest_enabled': c.digest_enabled,
+            'digest_interval': c.digest_interval,
         })
-    return result
+
+    settings = {s.section: s.data for s in Setting.objects.all()}
+    for section, values in SETTINGS_DEFAULTS.items():
+        settings.setdefault(section, {})
+        for k, v in values.items():
+            settings[section].setdefault(k, v)
+
+    return {
+        'menu': menu,
+        'tree': CategoryTree(copy.deepcopy(menu)),
+        'schemas': schemas,
+        'settings': settings,
+    }
+
+
+def _get_config() -> Dict[str, Any]:
+    """Devuelve la configuración en memoria, reconstruyéndola si cambió.
+
+    En estado estable solo se consulta la versión en el cache de Django.
+    Los valores devueltos son compartidos; las funciones públicas entregan
+    copias para que quien llama pueda modificarlas.
+    """
+    global _config_snapshot
+    version = _config_version()
+    snapshot = _config_snapshot
+    if snapshot['version'] == version:
+        return snapshot
+    with _config_lock:
+        if _config_snapshot['version'] != version:
+            # Si la versión cambia durante la consulta, la siguiente
+            # llamada verá otra versión y volverá a construir la copia
+            data = _build_config()
+            data['version'] = version
+            # Se reemplaza la referencia: quien ya leyó la copia anterior
+            # la sigue viendo completa
+            _config_snapshot = data
+        return _config_snapshot
+
+
+def load_menu(include_inactive: bool = False) -> List[Dict[str, Any]]:
+    menu = _get_config()['menu']
+    if not include_inactive:
+        menu = [c for c in menu if c['active']]
+    return copy.deepcopy(menu)
+
+
+def load_category_tree() -> CategoryTree:
+    """Árbol de categorías de la configuración actual (solo lectura)."""
+    return _get_config()['tree']
+
+
+EMPTY_SCHEMA = FormSchema(key='', name='', file_fields=(), text_fields=())
+
+
+def load_form_schema(cat_key: str) -> FormSchema:
+    """Esquema del formulario de ``cat_key``; vacío si la categoría no existe."""
+    return _get_config()['schemas'].get(cat_key, EMPTY_SCHEMA)
+
+
+def load_form_schemas(cat_keys: Iterable[str]) -> Dict[str, FormSchema]:
+    schemas = _get_config()['schemas']
+    return {k: schemas[k] for k in cat_keys if k in schemas}
 
 
 def load_file_fields(cat_key: str) -> List[Dict[str, Any]]:
-    try:
-        cat = Category.objects.get(key=cat_key)
-    except Category.DoesNotExist:
-        return []
-    fields = cat.file_fields.order_by('order')
     return [
-        {
-            'name': f.name,
-            'label': f.label,
-            'description': f.description,
-            'required': f.required,
-            'storage_name': f.storage_name,
-        }
-        for f in fields
+        {**f, 'allowed_types': list(f['allowed_types'])}
+        for f in load_form_schema(cat_key).file_fields
     ]
 
 
 def load_text_fields(cat_key: str) -> List[Dict[str, Any]]:
-    try:
-        cat = Category.objects.get(key=cat_key)
-    except Category.DoesNotExist:
-        return []
-    fields = cat.text_fields.order_by('order')
-    return [
-        {
-            'name': f.name,
-            'label': f.label,
-            'type': f.type,
-            'required': f.required,
-        }
-        for f in fields
-    ]
+    return [dict(f) for f in load_form_schema(cat_key).text_fields]
 
 
 def load_settings() -> Dict[str, Dict[str, Any]]:
-    settings = {s.section: s.data for s in Setting.objects.all()}
-    defaults = {
-        'mail': {
-            'mail_user': '',
-            'mail_password': '',
-            'smtp_host': 'smtp.office365.com',
-            'smtp_port': 587,
-            'tested': False,
-            'updated_at': '',
-            'tested_at': '',
-        },
-        'onedrive': {
-            'client_id': '',
-            'client_secret': '',
-            'tenant_id': '',
-            'user_id': '',
-            'tested': False,
-            'updated_at': '',
-            'tested_at': '',
-        },
-    }
-    for section, values in defaults.items():
-        settings.setdefault(section, {})
-        for k, v in values.items():
-            settings[section].setdefault(k, v)
-    return settings
+    return copy.deepcopy(_get_config()['settings'])
 
 
 def is_setup_complete() -> bool:
@@ -101,10 +317,10 @@ def is_setup_complete() -> bool:
     continúe inmediatamente después de guardar la configuración.
     """
 
-    settings = load_settings()
-    mail = settings.get('mail', {})
-    drive = settings.get('onedrive', {})
-    menu_ok = Category.objects.exists()
+    config = _get_config()
+    mail = config['settings'].get('mail', {})
+    drive = config['settings'].get('onedrive', {})
+    menu_ok = bool(config['menu'])
 
     # Correo configurado si usuario y contraseña están definidos
     mail_ok = bool(mail.get('mail_user') and mail.get('mail_password'))
@@ -118,4 +334,15 @@ def is_setup_complete() -> bool:
 
 
 def save_log_entry(**data) -> None:
-    LogEntry.objects.create(**data)
+    """Registra un evento; con ``LOG_BUFFER_SIZE`` se guarda en diferido.
+
+    En modo diferido el registro se agrega al buffer solo si la transacción
+    en curso se confirma.
+    """
+    if settings.LOG_BUFFER_SIZE > 0:
+        data.setdefault('timestamp', timezone.now())
+        transaction.on_commit(lambda: get_log_buffer().add(data))
+        return
+    with transaction.atomic():
+        entry = LogEntry.objects.create(**data)
+        record_entries([entry])
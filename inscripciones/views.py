@@ -1,31 +1,60 @@
 import os
-import uuid
-import re
+import json
 import logging
-from datetime import datetime
+from collections import namedtuple
+from urllib.parse import urlencode
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.core import signing
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.conf import settings
 from django.contrib.admin.views.decorators import staff_member_required
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST
 
-from .models import Setting
+from .models import Setting, Submission
 
 from .utils import (
-    load_menu,
-    load_file_fields,
-    load_text_fields,
+    load_category_tree,
+    load_form_schema,
     is_setup_complete,
     load_settings,
-    save_log_entry,
 )
-from services.onedrive import upload_files, normalize_path
-from services.mail import send_mail_custom
-from services.graph_auth import GraphAPIError, get_access_token
-from services.template_renderer import normalize_var, render_text
+from .logs import PAGE_SIZE, export_logs, filter_logs, log_to_dict, page_logs
+from .naming import compile_pattern, unique_name
+from .stats import stats_summary
+from .jobs import (
+    DIRECT_UPLOAD_TIMEOUT,
+    ESPERANDO_ARCHIVOS,
+    create_direct_submission,
+    enqueue_submission,
+    finalize_direct_submission,
+    split_emails,
+)
+from .uploads import (
+    EXTENSION_TYPES,
+    GraphStreamingUploadHandler,
+    ValidatingUploadHandler,
+    field_max_bytes,
+)
+from services.onedrive import (
+    MAX_UPLOAD_CONCURRENCY,
+    UPLOAD_CHUNK_SIZE,
+    create_upload_session,
+    ensure_folder,
+    normalize_path,
+)
+from services.graph_auth import GraphAPIError, get_access_token, invalidate_access_token
+from services.template_renderer import normalize_var
 
 logger = logging.getLogger(__name__)
 
+# Archivo declarado por el navegador en la carga directa a OneDrive
+DeclaredFile = namedtuple('DeclaredFile', ['name', 'size'])
+
 
 def index(request):
     setup_ok = is_setup_complete()
@@ -33,294 +62,463 @@ def index(request):
     if not setup_ok:
         messages.error(request, "Debe completar la configuración antes de continuar")
         return redirect("/admin/settings")
-    menu = load_menu()
-    roots = [i for i in menu if i['parent'] == '']
+    roots = load_category_tree().roots()
     return render(request, 'index.html', {'menu': roots, 'title': 'Inscripciones'})
 
 
+@csrf_exempt
 def inscripcion(request, key):
+    # Los manejadores de carga deben definirse antes de que el middleware
+    # CSRF lea request.POST; la verificación se hace en _inscripcion.
+    handler = None
+    if request.method == 'POST':
+        files_cfg = load_form_schema(key).file_fields
+        # Rechazar sin leer el cuerpo si ya excede la suma de los límites
+        limit = sum(field_max_bytes(f) for f in files_cfg) + (settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0)
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > limit:
+            logger.warning("Carga rechazada por tamaño: %s bytes", content_length)
+            messages.error(request, 'Los archivos exceden el tamaño máximo permitido')
+            return redirect(request.path)
+        request.upload_handlers.insert(0, ValidatingUploadHandler(request, files_cfg))
+        if getattr(settings, 'STREAM_UPLOADS_TO_ONEDRIVE', False):
+            handler = GraphStreamingUploadHandler(request)
+            request.upload_handlers.insert(1, handler)
+    try:
+        return _inscripcion(request, key)
+    finally:
+        # También si _inscripcion falla: los archivos ya subidos no deben quedar huérfanos
+        if handler and not getattr(request, 'inscripcion_encolada', False):
+            handler.discard()
+
+
+class FormError(Exception):
+    """Error de validación del formulario de inscripción."""
+
+
+def _read_text_fields(fields, data) -> dict:
+    """Valida los campos de texto y devuelve los datos de la inscripción."""
+    form_values = {}
+    dynamic_vars = {}
+    nombre = ''
+    solicitante_email = ''
+    for field in fields:
+        value = data.get(field['name'], '').strip()
+        if field.get('required') and not value:
+            raise FormError(f"El campo {field['label']} es obligatorio")
+        form_values[field['label']] = value
+        dynamic_vars[normalize_var(field['name'])] = value
+        if field['name'] == 'nombre':
+            nombre = value
+        if field['name'] == 'email':
+            solicitante_email = value
+    if not nombre:
+        raise FormError('Debe incluir el campo nombre')
+    return {
+        'nombre': nombre,
+        'email': solicitante_email,
+        'valores': form_values,
+        'variables': dynamic_vars,
+    }
+
+
+def _plan_files(cat, files_cfg, nombre, incoming) -> list:
+    """Valida los archivos y define el nombre final de cada uno.
+
+    ``incoming`` relaciona cada campo con un objeto con ``name`` y ``size``
+    (un archivo recibido o uno declarado por el navegador). Devuelve una
+    lista de ``(campo, archivo, registro)``.
+    """
+    planned = []
+    used_names = set()
+    namer = cat.get('file_namer') or compile_pattern(cat.get('file_pattern', ''))
+    now = timezone.now()
+    allowed_exts = [e.lower() for e in getattr(settings, 'UPLOAD_EXTENSIONS', [])]
+    for fcfg in files_cfg:
+        f = incoming.get(fcfg['name'])
+        if fcfg.get('required') and (not f or f.name == ''):
+            raise FormError(f"El archivo {fcfg['label']} es obligatorio")
+        if f and f.name != '':
+            filename = f.name
+            ext = os.path.splitext(filename)[1].lower()
+            if ext not in allowed_exts:
+                raise FormError(f'Archivo no permitido: {filename}')
+            allowed_types = fcfg.get('allowed_types') or []
+            if allowed_types and EXTENSION_TYPES.get(ext) not in allowed_types:
+                raise FormError(f"Tipo de archivo no permitido para {fcfg['label']}: {filename}")
+            size = f.size
+            if size > field_max_bytes(fcfg):
+                raise FormError(
+                    f"El archivo {fcfg['label']} excede el tamaño máximo ({field_max_bytes(fcfg)} bytes)"
+                )
+            stem = namer.stem(
+                categoria=cat['key'],
+                nombre=nombre,
+                label=fcfg['label'],
+                storage_name=fcfg.get('storage_name', '').strip(),
+                original=os.path.splitext(filename)[0],
+                now=now,
+            )
+            # Se sanea antes de comparar: dos nombres distintos pueden quedar
+            # iguales al quitarles los caracteres no válidos
+            stem = get_valid_filename(stem + ext)[:-len(ext)]
+            final_name = unique_name(stem, ext, used_names)
+            planned.append(
+                (
+                    fcfg['name'],
+                    f,
+                    {
+                        "nombre_original": filename,
+                        "nombre_final": final_name,
+                        "size_bytes": size,
+                    },
+                )
+            )
+
+    logger.info("Archivos listos para subir: %s", [r for _, _, r in planned])
+    if not planned:
+        raise FormError('Debe subir al menos un archivo')
+    return planned
+
+
+def _destination(cat, key, nombre) -> str:
+    """Valida la configuración necesaria y devuelve la carpeta de OneDrive."""
+    cfg = load_settings()
+    mail_cfg = cfg.get('mail', {})
+    drive_cfg = cfg.get('onedrive', {})
+    raw_base = cat.get('base_path', '').strip()
+    if not raw_base:
+        logger.error('Categoría sin ruta base configurada')
+        raise FormError('Categoría sin ruta base configurada')
+    base_path = normalize_path(raw_base)
+    recipients_cfg = cat.get('notify_emails', '').strip()
+    cc_cfg = cat.get('notify_cc_emails', '').strip()
+    bcc_cfg = cat.get('notify_bcc_emails', '').strip()
+
+    missing = []
+
+    # Validar configuración de correo (SMTP) mínima
+    if not (mail_cfg.get('mail_user') and mail_cfg.get('mail_password')):
+        missing.append('correo')
+
+    # Validar credenciales de OneDrive/Microsoft Graph
+    if not all(
+        drive_cfg.get(k) for k in ('client_id', 'client_secret', 'tenant_id', 'user_id')
+    ):
+        missing.append('credenciales de OneDrive')
+
+    if not recipients_cfg and not cc_cfg and not bcc_cfg:
+        missing.append('destinatarios')
+
+    if missing:
+        msg = ", ".join(missing)
+        logger.error("Configuración incompleta: falta %s", msg)
+        raise FormError(f"Configuración incompleta: falta {msg}")
+
+    parts = base_path.split('/')
+    if not parts or parts[-1].lower() != key.lower():
+        cat_path = normalize_path(base_path, key)
+    else:
+        cat_path = base_path
+    dest_dir = normalize_path(cat_path, nombre)
+    if ':' in dest_dir or '\\' in dest_dir:
+        logger.error("Ruta de OneDrive no válida: %s", dest_dir)
+        raise FormError(f"Ruta de OneDrive no válida: {dest_dir}")
+    logger.info("Ruta de OneDrive final: %s", dest_dir)
+
+    to_recipients = split_emails(recipients_cfg)
+    cc_recipients = split_emails(cc_cfg)
+    bcc_recipients = split_emails(bcc_cfg)
+    if not to_recipients and not cc_recipients and not bcc_recipients:
+        raise FormError('No hay destinatarios configurados para esta categoría')
+    logger.info(
+        "Destinatarios: to=%s cc=%s bcc=%s", to_recipients, cc_recipients, bcc_recipients
+    )
+    return dest_dir
+
+
+@csrf_protect
+def _inscripcion(request, key):
     setup_ok = is_setup_complete()
     logger.info("is_setup_complete: %s", setup_ok)
     if not setup_ok:
         messages.error(request, "Debe completar la configuración antes de continuar")
         return redirect("/admin/settings")
-    menu = load_menu()
-    cat = next((i for i in menu if i['key'] == key), None)
+    tree = load_category_tree()
+    cat = tree.get(key)
     if not cat:
         messages.error(request, 'Categoría no encontrada')
         return redirect('index')
 
-    children = [i for i in menu if i['parent'] == key]
+    children = tree.children(key)
     if children and request.method == 'GET':
         return render(request, 'index.html', {'menu': children, 'title': cat['name']})
 
-    files_cfg = load_file_fields(key)
-    fields = load_text_fields(key)
+    schema = load_form_schema(key)
 
     if request.method == 'POST':
         logger.info("Inicio de inscripción: %s", key)
+        # Acceder a FILES procesa el cuerpo y ejecuta la validación de cargas
+        uploaded = request.FILES
+        upload_errors = getattr(request, 'upload_errors', [])
+        if upload_errors:
+            for error in upload_errors:
+                messages.error(request, error)
+            return redirect(request.path)
         logger.info("Datos de formulario: %s", dict(request.POST))
         logger.info(
             "Archivos recibidos: %s",
-            {k: v.name for k, v in request.FILES.items()},
+            {k: v.name for k, v in uploaded.items()},
         )
-        form_values = {}
-        dynamic_vars = {}
-        nombre = ''
-        solicitante_email = ''
-        for field in fields:
-            value = request.POST.get(field['name'], '').strip()
-            if field.get('required') and not value:
-                messages.error(request, f"El campo {field['label']} es obligatorio")
-                return redirect(request.path)
-            form_values[field['label']] = value
-            dynamic_vars[normalize_var(field['name'])] = value
-            if field['name'] == 'nombre':
-                nombre = value
-            if field['name'] == 'email':
-                solicitante_email = value
-        if not nombre:
-            messages.error(request, 'Debe incluir el campo nombre')
-            return redirect(request.path)
-
-        uploaded_files = []
-        file_info = []
-        file_records = []
-        used_names = set()
-        allowed_exts = [e.lower() for e in getattr(settings, 'UPLOAD_EXTENSIONS', [])]
-        for fcfg in files_cfg:
-            f = request.FILES.get(fcfg['name'])
-            if fcfg.get('required') and (not f or f.name == ''):
-                messages.error(request, f"El archivo {fcfg['label']} es obligatorio")
-                return redirect(request.path)
-            if f and f.name != '':
-                filename = f.name
-                ext = os.path.splitext(filename)[1].lower()
-                if ext not in allowed_exts:
-                    messages.error(request, f'Archivo no permitido: {filename}')
-                    return redirect(request.path)
-                content = f.read()
-                size = len(content)
-                pattern = cat.get('file_pattern', '')
-                storage_name = fcfg.get('storage_name', '').strip()
-                final_name = filename
-                if pattern:
-                    now = datetime.utcnow()
-                    final_name = pattern
-                    label_value = storage_name or fcfg['label']
-                    final_name = final_name.replace('{categoria}', cat['key'])
-                    final_name = final_name.replace('{nombre}', nombre)
-                    final_name = final_name.replace('{label}', label_value)
-                    final_name = re.sub(
-                        r'{fecha(?::([^}]+))?}',
-                        lambda m: now.strftime(m.group(1) or '%Y%m%d'),
-                        final_name,
-                    )
-                    final_name = final_name.replace('{uuid}', uuid.uuid4().hex[:8])
-                    final_name = re.sub(r'[\\/:*?"<>|]', '_', final_name)
-                    max_len = 120
-                    if len(final_name) > max_len:
-                        final_name = final_name[:max_len]
-                    final_name = f"{final_name}{ext}"
-                    while final_name in used_names:
-                        final_name = f"{os.path.splitext(final_name)[0]}-{uuid.uuid4().hex[:4]}{ext}"
-                else:
-                    base = storage_name or os.path.splitext(filename)[0]
-                    base = re.sub(r'[\\/:*?"<>|]', '_', base)
-                    final_name = f"{base}{ext}"
-                    while final_name in used_names:
-                        final_name = f"{base}-{uuid.uuid4().hex[:4]}{ext}"
-                used_names.add(final_name)
-                file_info.append({"name": final_name, "size": size})
-                file_records.append(
-                    {
-                        "nombre_original": filename,
-                        "nombre_final": final_name,
-                        "size_bytes": size,
-                    }
-                )
-                uploaded_files.append({"name": final_name, "content": content})
-
-        archivos_html = '<ul>' + ''.join(
-            f"<li>{r['nombre_final']} ({r['size_bytes']} bytes)</li>" for r in file_records
-        ) + '</ul>'
-        logger.info("Archivos listos para subir: %s", file_info)
-        if not uploaded_files:
-            messages.error(request, 'Debe subir al menos un archivo')
-            return redirect(request.path)
-
-        cfg = load_settings()
-        mail_cfg = cfg.get('mail', {})
-        drive_cfg = cfg.get('onedrive', {})
-        raw_base = cat.get('base_path', '').strip()
-        if not raw_base:
-            logger.error('Categoría sin ruta base configurada')
-            messages.error(request, 'Categoría sin ruta base configurada')
-            return redirect(request.path)
-        base_path = normalize_path(raw_base)
-        recipients_cfg = cat.get('notify_emails', '').strip()
-        cc_cfg = cat.get('notify_cc_emails', '').strip()
-        bcc_cfg = cat.get('notify_bcc_emails', '').strip()
-
-        missing = []
-
-        # Validar configuración de correo (SMTP) mínima
-        if not (mail_cfg.get('mail_user') and mail_cfg.get('mail_password')):
-            missing.append('correo')
-
-        # Validar credenciales de OneDrive/Microsoft Graph
-        if not all(
-            drive_cfg.get(k) for k in ('client_id', 'client_secret', 'tenant_id', 'user_id')
-        ):
-            missing.append('credenciales de OneDrive')
-
-        if not recipients_cfg and not cc_cfg and not bcc_cfg:
-            missing.append('destinatarios')
-
-        if missing:
-            msg = ", ".join(missing)
-            logger.error("Configuración incompleta: falta %s", msg)
-            messages.error(request, f"Configuración incompleta: falta {msg}")
-            return redirect(request.path)
-
-        parts = base_path.split('/')
-        if not parts or parts[-1].lower() != key.lower():
-            cat_path = normalize_path(base_path, key)
-        else:
-            cat_path = base_path
-        dest_dir = normalize_path(cat_path, nombre)
-        if ':' in dest_dir or '\\' in dest_dir:
-            logger.error("Ruta de OneDrive no válida: %s", dest_dir)
-            messages.error(request, f"Ruta de OneDrive no válida: {dest_dir}")
-            return redirect(request.path)
-        logger.info("Ruta de OneDrive final: %s", dest_dir)
-
-        to_recipients = [r.strip() for r in recipients_cfg.split(',') if r.strip()]
-        cc_recipients = [r.strip() for r in cc_cfg.split(',') if r.strip()]
-        bcc_recipients = [r.strip() for r in bcc_cfg.split(',') if r.strip()]
-        if not to_recipients and not cc_recipients and not bcc_recipients:
-            messages.error(request, 'No hay destinatarios configurados para esta categoría')
-            return redirect(request.path)
-        logger.info(
-            "Destinatarios: to=%s cc=%s bcc=%s", to_recipients, cc_recipients, bcc_recipients
-        )
-
         try:
-            token = get_access_token(drive_cfg)
-            logger.info("Token de Graph obtenido: %s", bool(token))
-        except GraphAPIError as e:
-            logger.exception("Error obteniendo token de Graph")
-            messages.error(request, f"Error de autenticación: {e}")
+            fields_data = _read_text_fields(schema.text_fields, request.POST)
+            planned = _plan_files(cat, schema.file_fields, fields_data['nombre'], uploaded)
+            dest_dir = _destination(cat, key, fields_data['nombre'])
+        except FormError as e:
+            messages.error(request, str(e))
             return redirect(request.path)
 
-        folder_url = ''
+        file_records = [record for _, _, record in planned]
+        uploaded_files = []
+        for _, f, record in planned:
+            if getattr(f, 'item_id', None):
+                uploaded_files.append({"name": record['nombre_final'], "item_id": f.item_id, "size": f.size})
+            else:
+                uploaded_files.append({"name": record['nombre_final'], "file": f, "size": f.size})
         try:
-            folder_url = upload_files(token, dest_dir, uploaded_files)
-            logger.info("Archivos subidos a OneDrive: %s", folder_url)
-        except Exception as e:
-            logger.exception("Error subiendo archivos a OneDrive")
-            save_log_entry(
-                categoria_key=cat['key'],
-                categoria_nombre=cat['name'],
-                solicitante_nombre=nombre,
-                solicitante_email=solicitante_email,
-                one_drive_path=dest_dir,
-                one_drive_folder_url=folder_url,
-                archivos=file_records,
-                estado='ERROR_ONEDRIVE',
-                detalle_error=str(e),
-                destinatarios_to=to_recipients,
-                destinatarios_cc=cc_recipients,
-                user_admin='',
+            submission = enqueue_submission(
+                cat['id'], fields_data, dest_dir, file_records, uploaded_files
             )
-            messages.error(request, f"Error subiendo archivos: {e}")
+        except OSError as e:
+            logger.exception("Error guardando archivos de la inscripción")
+            messages.error(request, f"Error guardando archivos: {e}")
             return redirect(request.path)
-
-        vars_map = {
-            'CATEGORIA': cat['name'],
-            'CATEGORIA_KEY': cat['key'],
-            'CARPETA_URL': folder_url,
-            'ARCHIVOS_LISTA': archivos_html,
-            'USUARIO_ADMIN': '',
-        }
-        for k, v in dynamic_vars.items():
-            vars_map[k] = v
-        rendered_subject = render_text(cat.get('mail_subject_template', ''), vars_map)
-        rendered_body = render_text(cat.get('mail_body_template', ''), vars_map)
-        try:
-            send_mail_custom(
-                mail_cfg,
-                to_recipients,
-                rendered_subject,
-                rendered_body,
-                cc_recipients,
-                bcc_recipients,
-            )
-            status = 'ENVIADO'
-            messages.success(request, 'Inscripción completada')
-        except Exception as e:
-            logger.exception("Error enviando correo")
-            status = 'ERROR_MAIL'
-            messages.error(request, f"Error enviando correo: {e}")
-
-        save_log_entry(
-            categoria_key=cat['key'],
-            categoria_nombre=cat['name'],
-            solicitante_nombre=nombre,
-            solicitante_email=solicitante_email,
-            one_drive_path=dest_dir,
-            one_drive_folder_url=folder_url,
-            archivos=file_records,
-            estado=status,
-            detalle_error=''
-            if status == 'ENVIADO'
-            else 'Error en correo',
-            destinatarios_to=to_recipients,
-            destinatarios_cc=cc_recipients,
-            user_admin='',
-        )
-
+        request.inscripcion_encolada = True
+        logger.info("Inscripción %s en cola", submission.pk)
+        messages.success(request, 'Inscripción recibida')
         return redirect('index')
 
+    direct = getattr(settings, 'DIRECT_UPLOADS_TO_ONEDRIVE', False)
     return render(
         request,
         'form.html',
         {
             'cat': cat,
-            'files_cfg': files_cfg,
-            'fields': fields,
+            'files_cfg': schema.file_fields,
+            'fields': schema.text_fields,
             'upload_exts': getattr(settings, 'UPLOAD_EXTENSIONS', []),
+            'direct_upload': direct,
         },
     )
 
 
+# Cargas directas: el navegador sube los archivos a OneDrive con sesiones
+# creadas por el servidor y luego confirma la inscripción.
+DIRECT_TICKET_SALT = 'inscripciones.carga-directa'
+DIRECT_TICKET_MAX_AGE = int(DIRECT_UPLOAD_TIMEOUT.total_seconds())
+
+
+@require_POST
+def inscripcion_sesion(request, key):
+    if not getattr(settings, 'DIRECT_UPLOADS_TO_ONEDRIVE', False):
+        raise Http404
+    if not is_setup_complete():
+        return JsonResponse({'error': 'Debe completar la configuración antes de continuar'}, status=409)
+    tree = load_category_tree()
+    cat = tree.get(key)
+    if not cat or tree.children(key):
+        return JsonResponse({'error': 'Categoría no encontrada'}, status=404)
+
+    try:
+        declared = json.loads(request.POST.get('archivos') or '{}')
+        incoming = {
+            name: DeclaredFile(str(info['name']), int(info['size']))
+            for name, info in declared.items()
+        }
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'error': 'Descripción de archivos inválida'}, status=400)
+
+    try:
+        schema = load_form_schema(key)
+        fields_data = _read_text_fields(schema.text_fields, request.POST)
+        planned = _plan_files(cat, schema.file_fields, fields_data['nombre'], incoming)
+        dest_dir = _destination(cat, key, fields_data['nombre'])
+    except FormError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    drive_cfg = load_settings().get('onedrive', {})
+    file_records = []
+    uploads = []
+    try:
+        token = get_access_token(drive_cfg)
+        folder = ensure_folder(token, drive_cfg['user_id'], dest_dir)
+        for field_name, _, record in planned:
+            upload_url = create_upload_session(
+                token, drive_cfg['user_id'], folder['id'], record['nombre_final']
+            )
+            # Se guarda para cancelar la sesión si la carga no se finaliza
+            file_records.append({**record, 'upload_url': upload_url})
+            uploads.append(
+                {
+                    'field': field_name,
+                    'name': record['nombre_final'],
+                    'size': record['size_bytes'],
+                    'upload_url': upload_url,
+                }
+            )
+    except GraphAPIError as e:
+        logger.exception("Error preparando carga directa")
+        return JsonResponse({'error': f'Error preparando la carga: {e}'}, status=502)
+
+    submission = create_direct_submission(
+        cat['id'], fields_data, dest_dir, folder['webUrl'], file_records
+    )
+    logger.info("Inscripción %s esperando carga directa", submission.pk)
+    return JsonResponse(
+        {
+            'ticket': signing.dumps(submission.pk, salt=DIRECT_TICKET_SALT),
+            'chunk_size': UPLOAD_CHUNK_SIZE,
+            'uploads': uploads,
+            'finalize_url': reverse('inscripcion_finalizar', args=[key]),
+        }
+    )
+
+
+@require_POST
+def inscripcion_finalizar(request, key):
+    if not getattr(settings, 'DIRECT_UPLOADS_TO_ONEDRIVE', False):
+        raise Http404
+    try:
+        pk = signing.loads(
+            request.POST.get('ticket', ''), salt=DIRECT_TICKET_SALT, max_age=DIRECT_TICKET_MAX_AGE
+        )
+    except signing.BadSignature:
+        return JsonResponse({'error': 'Solicitud inválida'}, status=400)
+    submission = Submission.objects.filter(
+        pk=pk, category__key=key, status=ESPERANDO_ARCHIVOS
+    ).first()
+    if submission is None:
+        return JsonResponse({'error': 'Inscripción no encontrada'}, status=404)
+    try:
+        finalize_direct_submission(submission)
+    except (ValueError, GraphAPIError) as e:
+        logger.warning("Carga directa %s no válida: %s", submission.pk, e)
+        return JsonResponse({'error': str(e)}, status=400)
+    logger.info("Inscripción %s en cola", submission.pk)
+    messages.success(request, 'Inscripción recibida')
+    return JsonResponse({'redirect': reverse('index')})
+
+
 @staff_member_required
 def settings_view(request):
     cfg = load_settings()
     if request.method == 'POST':
+        try:
+            smtp_port = int(request.POST.get('smtp_port') or 0)
+            upload_concurrency = int(request.POST.get('upload_concurrency') or 1)
+        except ValueError:
+            messages.error(request, 'El puerto SMTP y las subidas simultáneas deben ser números enteros')
+            return render(request, 'settings.html', {'settings': cfg})
         mail = cfg.get('mail', {})
         mail.update(
             {
                 'mail_user': request.POST.get('mail_user', '').strip(),
                 'mail_password': request.POST.get('mail_password', '').strip(),
                 'smtp_host': request.POST.get('smtp_host', '').strip(),
-                'smtp_port': int(request.POST.get('smtp_port') or 0),
+                'smtp_port': smtp_port,
             }
         )
         Setting.objects.update_or_create(section='mail', defaults={'data': mail})
 
         drive = cfg.get('onedrive', {})
+        # El token en caché pertenece a las credenciales anteriores
+        invalidate_access_token(drive)
         drive.update(
             {
                 'client_id': request.POST.get('client_id', '').strip(),
                 'client_secret': request.POST.get('client_secret', '').strip(),
                 'tenant_id': request.POST.get('tenant_id', '').strip(),
                 'user_id': request.POST.get('user_id', '').strip(),
+                'upload_concurrency': max(1, min(upload_concurrency, MAX_UPLOAD_CONCURRENCY)),
             }
         )
         Setting.objects.update_or_create(section='onedrive', defaults={'data': drive})
+        invalidate_access_token(drive)
 
         messages.success(request, 'Configuración actualizada')
         return redirect('/admin/settings')
 
     return render(request, 'settings.html', {'settings': cfg})
+
+
+LOG_FILTERS = ('categoria', 'estado', 'desde', 'hasta', 'archivo')
+
+
+def _log_query(request):
+    params = {k: request.GET.get(k, '').strip() for k in LOG_FILTERS}
+    try:
+        limit = int(request.GET.get('limit') or PAGE_SIZE)
+    except ValueError:
+        limit = PAGE_SIZE
+    qs = filter_logs(**params)
+    entries, next_cursor = page_logs(qs, request.GET.get('cursor', ''), limit)
+    return params, entries, next_cursor
+
+
+@staff_member_required
+def logs_view(request):
+    try:
+        params, entries, next_cursor = _log_query(request)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('logs')
+    next_query = None
+    if next_cursor:
+        next_query = urlencode({**{k: v for k, v in params.items() if v}, 'cursor': next_cursor})
+    return render(
+        request,
+        'logs.html',
+        {'entries': entries, 'filters': params, 'next_query': next_query},
+    )
+
+
+@staff_member_required
+def logs_api(request):
+    try:
+        _, entries, next_cursor = _log_query(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'results': [log_to_dict(e) for e in entries], 'next': next_cursor})
+
+
+@staff_member_required
+def logs_export(request):
+    params = {k: request.GET.get(k, '').strip() for k in LOG_FILTERS}
+    formato = request.GET.get('formato', 'csv')
+    compress = request.GET.get('gzip') in ('1', 'true')
+    try:
+        chunks = export_logs(filter_logs(**params), formato, compress)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    filename = f"inscripciones-{timezone.localdate().isoformat()}.{formato}"
+    content_type = 'text/csv; charset=utf-8' if formato == 'csv' else 'application/x-ndjson'
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@staff_member_required
+def stats_view(request):
+    filters = {k: request.GET.get(k, '').strip() for k in ('categoria', 'desde', 'hasta')}
+    try:
+        summary = stats_summary(**filters)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('stats')
+    return render(request, 'stats.html', {'filters': filters, **summary})
@@ -1,15 +1,21 @@
+import hashlib
 import logging
 import requests
+from django.core.cache import cache
 from inscripciones.utils import load_settings
+from .graph_client import get_client
 
 
 logger = logging.getLogger(__name__)
 
+# Margen de seguridad para renovar el token antes de que expire (segundos)
+TOKEN_REFRESH_MARGIN = 300
+
 
 class GraphAPIError(Exception):
     """Excepción para errores de Microsoft Graph."""
 
-    def __init__(self, status_code, message):
+    def __init__(self, status_code, message, files=None, retry_after=None):
         messages = {
             400: 'Solicitud inválida',
             401: 'Credenciales inválidas o sin permisos',
@@ -17,15 +23,43 @@ class GraphAPIError(Exception):
             404: 'Recurso no encontrado',
         }
         msg = messages.get(status_code, message)
-        super().__init__(f"Graph API error {status_code}: {msg}")
+        detail = f"Graph API error {status_code}: {msg}"
+        if files:
+            detail += f" (archivos con error: {', '.join(files)})"
+        super().__init__(detail)
         self.status_code = status_code
         self.message = msg
+        self.files = list(files or [])
+        # Segundos indicados por Graph en ``Retry-After`` (429/503), si los hubo
+        self.retry_after = retry_after
+
+
+def _token_cache_key(cfg) -> str:
+    raw = f"{cfg.get('tenant_id', '')}:{cfg.get('client_id', '')}"
+    return f"graph_token:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+def invalidate_access_token(cfg=None) -> None:
+    """Elimina del caché compartido el token asociado a ``cfg``."""
+    if cfg is None:
+        cfg = load_settings().get('onedrive', {})
+    cache.delete(_token_cache_key(cfg))
+
 
+def get_access_token(cfg=None, force_refresh=False):
+    """Obtiene un token de acceso usando client_credentials.
 
-def get_access_token(cfg=None):
-    """Obtiene un token de acceso usando client_credentials."""
+    El token se guarda en el caché de Django (compartido entre procesos)
+    por tenant y cliente, y se renueva ``TOKEN_REFRESH_MARGIN`` segundos
+    antes de su expiración.
+    """
     if cfg is None:
         cfg = load_settings().get('onedrive', {})
+    cache_key = _token_cache_key(cfg)
+    if not force_refresh:
+        token = cache.get(cache_key)
+        if token:
+            return token
     url = f"https://login.microsoftonline.com/{cfg.get('tenant_id')}/oauth2/v2.0/token"
     data = {
         'client_id': cfg.get('client_id'),
@@ -34,16 +68,20 @@ def get_access_token(cfg=None):
         'grant_type': 'client_credentials',
     }
     try:
-        response = requests.post(url, data=data)
+        response = get_client().post(url, data=data)
         response.raise_for_status()
     except requests.RequestException as e:
         status = getattr(e.response, 'status_code', 0)
         text = getattr(e.response, 'text', str(e))
         logger.exception("Error obteniendo token de Graph")
         raise GraphAPIError(status, text) from e
-    token = response.json().get('access_token')
+    payload = response.json()
+    token = payload.get('access_token')
     if not token:
         logger.error("No se recibió el token de acceso")
         raise GraphAPIError(getattr(response, 'status_code', 0), 'Token no recibido')
+    timeout = int(payload.get('expires_in') or 0) - TOKEN_REFRESH_MARGIN
+    if timeout > 0:
+        cache.set(cache_key, token, timeout)
     logger.info("Token de Graph obtenido")
     return token
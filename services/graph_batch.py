@@ -0,0 +1,132 @@
+import logging
+import time
+
+import requests
+
+from .graph_auth import GraphAPIError
+from .graph_client import GRAPH_URL, get_client
+
+logger = logging.getLogger(__name__)
+
+# Límite de Graph para peticiones dentro de un mismo $batch
+MAX_BATCH_SIZE = 20
+
+
+def raise_for_item(item: dict) -> dict:
+    """Raise ``GraphAPIError`` if a batch sub-response failed.
+
+    Returns the sub-response body otherwise.
+    """
+    status = item.get('status', 0)
+    body = item.get('body') or {}
+    if 200 <= status < 300:
+        return body
+    error = body.get('error', {}) if isinstance(body, dict) else {}
+    raise GraphAPIError(status, error.get('message') or str(body))
+
+
+class GraphBatch:
+    """Agrupa peticiones pequeñas de Graph en llamadas a ``/$batch``.
+
+    Cada petición recibe un id; ``depends_on`` ordena su ejecución después
+    de otra petición del mismo lote. Si la dependencia falla, la petición no
+    se ejecuta y su respuesta tiene estado 424, igual que en Graph.
+    """
+
+    def __init__(self, token: str):
+        self.token = token
+        self._requests: list[dict] = []
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def add(self, method: str, url: str, body=None, depends_on: str | None = None) -> str:
+        """Queue a request and return its id. ``url`` is relative to v1.0."""
+        if url.startswith(GRAPH_URL):
+            url = url[len(GRAPH_URL):]
+        req = {'id': str(len(self._requests) + 1), 'method': method.upper(), 'url': url}
+        if body is not None:
+            req['body'] = body
+            req['headers'] = {'Content-Type': 'application/json'}
+        if depends_on:
+            req['dependsOn'] = [depends_on]
+        self._requests.append(req)
+        return req['id']
+
+    def _post(self, requests_chunk: list[dict]) -> list[dict]:
+        headers = {
+            'Authorization': f'Bearer {self.token}',
+            'Content-Type': 'application/json',
+        }
+        try:
+            r = get_client().post(f"{GRAPH_URL}/$batch", headers=headers, json={'requests': requests_chunk})
+            r.raise_for_status()
+        except requests.RequestException as e:
+            logger.exception("Error ejecutando lote de Graph")
+            status = getattr(e.response, 'status_code', 0)
+            text = getattr(e.response, 'text', str(e))
+            raise GraphAPIError(status, text) from e
+        return r.json().get('responses', [])
+
+    def _retry_delay(self, items: list[dict]) -> float:
+        client = get_client()
+        delays = []
+        for item in items:
+            value = (item.get('headers') or {}).get('Retry-After')
+            try:
+                delays.append(float(value))
+            except (TypeError, ValueError):
+                delays.append(client.backoff)
+        return min(client.max_backoff, max(delays))
+
+    def execute(self) -> dict[str, dict]:
+        """Send the queued requests and return the sub-responses by id.
+
+        Requests are sent in chunks of ``MAX_BATCH_SIZE``; chunks run in order
+        so dependencies on an earlier chunk are already resolved. Throttled
+        sub-requests (429/503/504) are resent with the client's retry policy.
+        """
+        results: dict[str, dict] = {}
+        pending = list(self._requests)
+        self._requests = []
+        client = get_client()
+        for start in range(0, len(pending), MAX_BATCH_SIZE):
+            chunk = []
+            for req in pending[start:start + MAX_BATCH_SIZE]:
+                dep = (req.get('dependsOn') or [None])[0]
+                if dep in results:
+                    if not 200 <= results[dep].get('status', 0) < 300:
+                        results[req['id']] = {'id': req['id'], 'status': 424, 'body': {}}
+                        continue
+                    req = {k: v for k, v in req.items() if k != 'dependsOn'}
+                chunk.append(req)
+
+            attempt = 0
+            while chunk:
+                by_id = {item['id']: item for item in self._post(chunk)}
+                results.update(by_id)
+                throttled = [
+                    item for item in by_id.values()
+                    if item.get('status') in client.RETRY_STATUSES
+                ]
+                if not throttled or attempt >= client.max_retries:
+                    break
+                delay = self._retry_delay(throttled)
+                logger.warning(
+                    "Lote de Graph con %s peticiones limitadas, reintento en %.1fs",
+                    len(throttled), delay,
+                )
+                time.sleep(delay)
+                attempt += 1
+                retry_ids = {item['id'] for item in throttled}
+                # Reenviar también las que fallaron por depender de una limitada
+                for req in chunk:
+                    dep = (req.get('dependsOn') or [None])[0]
+                    if by_id.get(req['id'], {}).get('status') == 424 and dep in retry_ids:
+                        retry_ids.add(req['id'])
+                chunk = [
+                    req if (req.get('dependsOn') or [None])[0] in retry_ids
+                    else {k: v for k, v in req.items() if k != 'dependsOn'}
+                    for req in chunk if req['id'] in retry_ids
+                ]
+        return results
@@ -0,0 +1,136 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+GRAPH_URL = 'https://graph.microsoft.com/v1.0'
+
+# Métodos que pueden repetirse tras un error de red sin duplicar efectos
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+
+
+def parse_retry_after(response) -> float | None:
+    """Segundos indicados en ``Retry-After`` (número o fecha HTTP), sin límite."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class GraphClient:
+    """Cliente HTTP reutilizable para Microsoft Graph.
+
+    Mantiene una ``requests.Session`` con conexiones persistentes, aplica un
+    timeout por llamada y reintenta las respuestas 429/503/504 con backoff
+    exponencial respetando el encabezado ``Retry-After``.
+    """
+
+    RETRY_STATUSES = frozenset({429, 503, 504})
+
+    def __init__(
+        self,
+        timeout=(5, 60),
+        max_retries: int = 4,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        pool_size: int = 10,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return delay + random.uniform(0, delay / 4)
+
+    def retry_after(self, response) -> float | None:
+        """``Retry-After`` limitado a ``max_backoff`` para esperar dentro de la llamada."""
+        delay = parse_retry_after(response)
+        return None if delay is None else min(self.max_backoff, delay)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Ejecuta la petición con reintentos y devuelve la respuesta final.
+
+        Los errores HTTP no se convierten en excepciones; el llamador decide
+        con ``raise_for_status`` como hasta ahora. ``max_retries`` reemplaza
+        el límite del cliente para esta llamada (``0`` para no reintentar).
+        """
+        method = method.upper()
+        kwargs.setdefault('timeout', self.timeout)
+        max_retries = kwargs.pop('max_retries', None)
+        if max_retries is None:
+            max_retries = self.max_retries
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                retriable = method in IDEMPOTENT_METHODS or isinstance(e, requests.ConnectTimeout)
+                if not retriable or attempt >= max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(
+                    "Error de red en %s %s, reintento %s en %.1fs: %s",
+                    method, url, attempt + 1, delay, e,
+                )
+            else:
+                if response.status_code not in self.RETRY_STATUSES or attempt >= max_retries:
+                    return response
+                delay = self.retry_after(response)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                logger.warning(
+                    "Graph respondió %s en %s %s, reintento %s en %.1fs",
+                    response.status_code, method, url, attempt + 1, delay,
+                )
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GraphClient:
+    """Devuelve el cliente compartido del proceso, creándolo si hace falta."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GraphClient()
+    return _client
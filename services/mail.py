@@ -1,5 +1,7 @@
+import io
+import json
 import logging
-import smtplib
+import math
 from email.mime.text import MIMEText
 import base64
 import requests
@@ -7,6 +9,9 @@ from django.template.loader import render_to_string
 
 from inscripciones.utils import load_settings
 from .graph_auth import GraphAPIError, get_access_token
+from .graph_client import GRAPH_URL, get_client, parse_retry_after
+from .onedrive import upload_chunks
+from .smtp_pool import get_smtp_pool
 
 logger = logging.getLogger(__name__)
 
@@ -34,10 +39,7 @@ def test_connection(
     msg['Subject'] = 'Prueba de correo'
     msg['From'] = user
     msg['To'] = user
-    with smtplib.SMTP(host, port) as server:
-        server.starttls()
-        server.login(user, password)
-        server.send_message(msg)
+    get_smtp_pool().send_messages(host, port, user, password, [msg])
 
 
 def send_test_email(to: str, subject: str, body: str, content_type: str = 'Text') -> None:
@@ -47,7 +49,7 @@ def send_test_email(to: str, subject: str, body: str, content_type: str = 'Text'
     try:
         if all(drive_cfg.get(k) for k in ('client_id', 'client_secret', 'tenant_id', 'user_id')):
             token = get_access_token(drive_cfg)
-            url = f"https://graph.microsoft.com/v1.0/users/{drive_cfg['user_id']}/sendMail"
+            url = f"{GRAPH_URL}/users/{drive_cfg['user_id']}/sendMail"
             headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
             msg = {
                 'message': {
@@ -57,18 +59,10 @@ def send_test_email(to: str, subject: str, body: str, content_type: str = 'Text'
                 },
                 'saveToSentItems': 'true',
             }
-            response = requests.post(url, headers=headers, json=msg)
+            response = get_client().post(url, headers=headers, json=msg)
             response.raise_for_status()
         else:
-            user, password, host, port = _get_cfg()
-            msg = MIMEText(body, 'html' if content_type.upper() == 'HTML' else 'plain')
-            msg['Subject'] = subject
-            msg['From'] = user
-            msg['To'] = to
-            with smtplib.SMTP(host, port) as server:
-                server.starttls()
-                server.login(user, password)
-                server.send_message(msg)
+            send_mail_smtp([{'subject': subject, 'body': body, 'to': [to], 'content_type': content_type}])
     except requests.RequestException as e:
         status = getattr(e.response, 'status_code', 0)
         text = getattr(e.response, 'text', str(e))
@@ -76,6 +70,147 @@ def send_test_email(to: str, subject: str, body: str, content_type: str = 'Text'
         raise GraphAPIError(status, text) from e
 
 
+def send_mail_smtp(messages) -> None:
+    """Envía por SMTP una lista de mensajes reutilizando conexiones del pool.
+
+    Cada mensaje es un dict con ``subject``, ``body``, ``to`` y opcionalmente
+    ``cc``, ``bcc`` y ``content_type`` (``HTML`` por defecto).
+    """
+    user, password, host, port = _get_cfg()
+    mime_messages = []
+    for m in messages:
+        content_type = m.get('content_type', 'HTML')
+        msg = MIMEText(m['body'], 'html' if content_type.upper() == 'HTML' else 'plain')
+        msg['Subject'] = m['subject']
+        msg['From'] = user
+        if m.get('to'):
+            msg['To'] = ', '.join(m['to'])
+        if m.get('cc'):
+            msg['Cc'] = ', '.join(m['cc'])
+        # Bcc no va en los encabezados; se agrega solo como destinatario del sobre
+        recipients = list(m.get('to', [])) + list(m.get('cc', [])) + list(m.get('bcc', []))
+        mime_messages.append((msg, recipients))
+    pool = get_smtp_pool()
+    pool.send_messages(host, port, user, password, mime_messages)
+    logger.info('Correos enviados por SMTP: %s', len(mime_messages))
+
+
+# Graph rechaza adjuntos en línea de más de 3 MB y solicitudes de más de 4 MB.
+# El contenido viaja en base64 (4/3 del tamaño), así que también se compara
+# el tamaño codificado de la solicitud
+INLINE_ATTACHMENT_LIMIT = 3 * 1024 * 1024
+REQUEST_SIZE_LIMIT = 4 * 1024 * 1024
+# Margen para el resto del JSON de cada adjunto (tipo, claves, separadores)
+ATTACHMENT_JSON_OVERHEAD = 256
+# Las sesiones de carga de adjuntos aceptan partes de hasta 4 MB
+ATTACHMENT_CHUNK_SIZE = 10 * 320 * 1024
+
+
+def _attachment_size(a: dict) -> int:
+    if 'content' in a:
+        return len(a['content'])
+    if a.get('size') is not None:
+        return a['size']
+    fh = a['file']
+    pos = fh.tell()
+    size = fh.seek(0, io.SEEK_END)
+    fh.seek(pos)
+    return size
+
+
+def _encoded_size(a: dict, size: int) -> int:
+    """Bytes que ocupa el adjunto en el JSON de la solicitud."""
+    return 4 * math.ceil(size / 3) + len(json.dumps(a['name'])) + ATTACHMENT_JSON_OVERHEAD
+
+
+def _fits_inline(a: dict, size: int) -> bool:
+    """Si el adjunto se puede agregar al borrador en una sola solicitud."""
+    return size <= INLINE_ATTACHMENT_LIMIT and _encoded_size(a, size) <= REQUEST_SIZE_LIMIT
+
+
+def _file_attachment(a: dict) -> dict:
+    content = a['content'] if 'content' in a else a['file'].read()
+    return {
+        '@odata.type': '#microsoft.graph.fileAttachment',
+        'name': a['name'],
+        'contentBytes': base64.b64encode(content).decode('utf-8'),
+    }
+
+
+def _graph_call(method, url, token, log_message, json=None, max_retries=None):
+    client = get_client()
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    try:
+        response = client.request(method, url, headers=headers, json=json, max_retries=max_retries)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        status = getattr(e.response, 'status_code', 0)
+        text = getattr(e.response, 'text', str(e))
+        # Sin límite: el outbox pausa el buzón todo lo que Graph pide
+        retry_after = parse_retry_after(e.response) if e.response is not None else None
+        logger.exception(log_message)
+        raise GraphAPIError(status, text, retry_after=retry_after) from e
+    return response
+
+
+def _send_message(token, user_id, message, attachments, max_retries=None):
+    """Envía ``message`` por Graph con sus adjuntos.
+
+    Si los adjuntos caben en línea se usa una sola llamada a ``sendMail``.
+    Si no, se crea un borrador, los adjuntos pequeños se agregan de a uno y
+    los grandes por sesiones de carga en partes, y luego se envía el
+    borrador. Cada archivo se lee por separado, así que la memoria usada no
+    depende del total adjuntado.
+    """
+    sizes = [_attachment_size(a) for a in attachments]
+    envelope = len(json.dumps({'message': message, 'saveToSentItems': 'true'}))
+    encoded = envelope + sum(_encoded_size(a, size) for a, size in zip(attachments, sizes))
+    if sum(sizes) <= INLINE_ATTACHMENT_LIMIT and encoded <= REQUEST_SIZE_LIMIT:
+        if attachments:
+            message = {**message, 'attachments': [_file_attachment(a) for a in attachments]}
+        _graph_call(
+            'POST',
+            f"{GRAPH_URL}/users/{user_id}/sendMail",
+            token,
+            'Error enviando correo',
+            json={'message': message, 'saveToSentItems': 'true'},
+            max_retries=max_retries,
+        )
+        return
+
+    base = f"{GRAPH_URL}/users/{user_id}/messages"
+    draft = _graph_call(
+        'POST', base, token, 'Error creando borrador de correo', json=message, max_retries=max_retries
+    ).json()
+    draft_url = f"{base}/{draft['id']}"
+    try:
+        for a, size in zip(attachments, sizes):
+            if _fits_inline(a, size):
+                _graph_call(
+                    'POST', f"{draft_url}/attachments", token,
+                    'Error adjuntando archivo al correo', json=_file_attachment(a),
+                )
+                continue
+            session = _graph_call(
+                'POST', f"{draft_url}/attachments/createUploadSession", token,
+                'Error creando sesión de carga de adjunto',
+                json={'AttachmentItem': {'attachmentType': 'file', 'name': a['name'], 'size': size}},
+            ).json()
+            fileobj = a['file'] if 'file' in a else io.BytesIO(a['content'])
+            upload_chunks(session['uploadUrl'], fileobj, size, chunk_size=ATTACHMENT_CHUNK_SIZE)
+        _graph_call('POST', f"{draft_url}/send", token, 'Error enviando correo', max_retries=max_retries)
+    except GraphAPIError:
+        try:
+            get_client().delete(draft_url, headers={'Authorization': f'Bearer {token}'})
+        except requests.RequestException:
+            logger.warning('No se pudo eliminar el borrador %s', draft['id'])
+        raise
+
+
+def _recipients(addresses):
+    return [{'emailAddress': {'address': e}} for e in addresses]
+
+
 def send_mail_custom(
     token,
     user_id,
@@ -85,8 +220,15 @@ def send_mail_custom(
     cc_recipients=None,
     bcc_recipients=None,
     attachments=None,
+    max_retries=None,
 ):
-    """Envía un correo con asunto y cuerpo personalizados usando Microsoft Graph."""
+    """Envía un correo con asunto y cuerpo personalizados usando Microsoft Graph.
+
+    Cada adjunto es ``{'name', 'content'}`` o ``{'name', 'file', 'size'}``
+    con un archivo abierto en modo binario. ``max_retries=0`` desactiva los
+    reintentos del cliente ante 429/503 para que quien llama (el outbox)
+    administre la espera.
+    """
     if cc_recipients is None:
         cc_recipients = []
     if bcc_recipients is None:
@@ -94,39 +236,14 @@ def send_mail_custom(
     if attachments is None:
         attachments = []
 
-    url = f"https://graph.microsoft.com/v1.0/users/{user_id}/sendMail"
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json',
+    message = {
+        'subject': subject,
+        'body': {'contentType': 'HTML', 'content': body},
+        'toRecipients': _recipients(to_recipients),
+        'ccRecipients': _recipients(cc_recipients),
+        'bccRecipients': _recipients(bcc_recipients),
     }
-    msg = {
-        'message': {
-            'subject': subject,
-            'body': {'contentType': 'HTML', 'content': body},
-            'toRecipients': [{'emailAddress': {'address': e}} for e in to_recipients],
-            'ccRecipients': [{'emailAddress': {'address': e}} for e in cc_recipients],
-            'bccRecipients': [{'emailAddress': {'address': e}} for e in bcc_recipients],
-        },
-        'saveToSentItems': 'true',
-    }
-    if attachments:
-        msg['message']['attachments'] = [
-            {
-                '@odata.type': '#microsoft.graph.fileAttachment',
-                'name': a['name'],
-                'contentBytes': base64.b64encode(a['content']).decode('utf-8'),
-            }
-            for a in attachments
-        ]
-
-    try:
-        response = requests.post(url, headers=headers, json=msg)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        status = getattr(e.response, 'status_code', 0)
-        text = getattr(e.response, 'text', str(e))
-        logger.exception('Error enviando correo')
-        raise GraphAPIError(status, text) from e
+    _send_message(token, user_id, message, attachments, max_retries=max_retries)
     logger.info('Correo enviado: %s', ', '.join(to_recipients + cc_recipients + bcc_recipients))
 
 
@@ -145,11 +262,6 @@ def send_mail(
     """Envía un correo usando Microsoft Graph."""
     if cc_recipients is None:
         cc_recipients = []
-    url = f"https://graph.microsoft.com/v1.0/users/{user_id}/sendMail"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
     body = render_to_string(
         template,
         {
@@ -160,33 +272,11 @@ def send_mail(
         },
     )
 
-    msg = {
-        "message": {
-            "subject": f"Inscripción recibida: {nombre} - {categoria}",
-            "body": {"contentType": "HTML", "content": body},
-            "toRecipients": [{"emailAddress": {"address": e}} for e in to_recipients],
-            "ccRecipients": [{"emailAddress": {"address": e}} for e in cc_recipients],
-        },
-        "saveToSentItems": "true",
+    message = {
+        "subject": f"Inscripción recibida: {nombre} - {categoria}",
+        "body": {"contentType": "HTML", "content": body},
+        "toRecipients": _recipients(to_recipients),
+        "ccRecipients": _recipients(cc_recipients),
     }
-
-    if attachments:
-        msg["message"]["attachments"] = [
-            {
-                "@odata.type": "#microsoft.graph.fileAttachment",
-                "name": a["name"],
-                "contentBytes": base64.b64encode(a["content"]).decode("utf-8"),
-            }
-            for a in attachments
-        ]
-
-    try:
-        response = requests.post(url, headers=headers, json=msg)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        status = getattr(e.response, 'status_code', 0)
-        text = getattr(e.response, 'text', str(e))
-        logger.exception("Error enviando correo")
-        raise GraphAPIError(status, text) from e
+    _send_message(token, user_id, message, attachments or [])
     logger.info("Correo enviado: %s", ", ".join(to_recipients + cc_recipients))
-
@@ -1,16 +1,39 @@
+import hashlib
+import io
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import PurePosixPath
+from urllib.parse import quote
 
 import requests
+from django.core.cache import cache
 from django.utils.text import get_valid_filename
 
 from .graph_auth import GraphAPIError, get_access_token
+from .graph_batch import GraphBatch, raise_for_item
+from .graph_client import GRAPH_URL, get_client
 
 logger = logging.getLogger(__name__)
 
+# Tiempo que se conserva en caché la relación ruta -> carpeta de OneDrive
+FOLDER_CACHE_TTL = 24 * 60 * 60
+
+# Archivos mayores a este tamaño se suben con una sesión de carga por partes
+UPLOAD_SESSION_THRESHOLD = 4 * 1024 * 1024
+# Tamaño de cada parte; Graph exige múltiplos de 320 KiB
+UPLOAD_CHUNK_SIZE = 16 * 320 * 1024
+# Subidas simultáneas como máximo: el pool de conexiones de GraphClient
+MAX_UPLOAD_CONCURRENCY = 10
+# Reanudaciones permitidas tras errores transitorios en una misma sesión
+UPLOAD_MAX_RESUMES = 5
+
 
 def test_connection(client_id, tenant_id, client_secret):
-    get_access_token({'client_id': client_id, 'tenant_id': tenant_id, 'client_secret': client_secret})
+    # Sin caché: el token guardado no depende del secreto, la prueba debe autenticar
+    get_access_token(
+        {'client_id': client_id, 'tenant_id': tenant_id, 'client_secret': client_secret},
+        force_refresh=True,
+    )
 
 
 def normalize_path(*segments: str) -> str:
@@ -28,14 +51,38 @@ def normalize_path(*segments: str) -> str:
     return str(PurePosixPath(joined)).strip("/")
 
 
-def create_folder_if_not_exists(token, user_id, folder_name, parent='root'):
+def _folder_cache_key(user_id: str, path: str) -> str:
+    # OneDrive no distingue mayúsculas en los nombres de carpeta
+    raw = f"{user_id}:{normalize_path(path).lower()}"
+    return f"onedrive_folder:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+def get_cached_folder(user_id: str, path: str) -> dict | None:
+    """Return the cached ``{'id', 'webUrl'}`` entry for ``path`` if any."""
+    return cache.get(_folder_cache_key(user_id, path))
+
+
+def cache_folder(user_id: str, path: str, item: dict) -> dict:
+    """Store the id and webUrl of a folder item under its normalized path."""
+    entry = {'id': item['id'], 'webUrl': item.get('webUrl', '')}
+    cache.set(_folder_cache_key(user_id, path), entry, FOLDER_CACHE_TTL)
+    return entry
+
+
+def invalidate_folder(user_id: str, path: str) -> None:
+    """Forget the cached folder for ``path`` (e.g. after a 404)."""
+    cache.delete(_folder_cache_key(user_id, path))
+
+
+def _find_or_create_folder(token, user_id, folder_name, parent='root'):
     headers = {'Authorization': f'Bearer {token}'}
-    base_url = f"https://graph.microsoft.com/v1.0/users/{user_id}/drive/{parent}/children"
+    base_url = f"{GRAPH_URL}/users/{user_id}/drive/{parent}/children"
+    escaped = folder_name.replace("'", "''")
     try:
-        r = requests.get(
+        r = get_client().get(
             base_url,
             headers=headers,
-            params={"$filter": f"name eq '{folder_name}'"},
+            params={"$filter": f"name eq '{escaped}'"},
         )
         r.raise_for_status()
     except requests.RequestException as e:
@@ -45,7 +92,7 @@ def create_folder_if_not_exists(token, user_id, folder_name, parent='root'):
         raise GraphAPIError(status, text) from e
     items = r.json().get("value", [])
     if items:
-        return items[0]["id"]
+        return items[0]
     headers["Content-Type"] = "application/json"
     data = {
         "name": folder_name,
@@ -53,64 +100,423 @@ def create_folder_if_not_exists(token, user_id, folder_name, parent='root'):
         "@microsoft.graph.conflictBehavior": "rename",
     }
     try:
-        r = requests.post(base_url, headers=headers, json=data)
+        r = get_client().post(base_url, headers=headers, json=data)
         r.raise_for_status()
     except requests.RequestException as e:
         logger.exception("Error creando carpeta en OneDrive")
         status = getattr(e.response, 'status_code', 0)
         text = getattr(e.response, 'text', str(e))
         raise GraphAPIError(status, text) from e
-    return r.json()["id"]
+    return r.json()
+
+
+def create_folder_if_not_exists(token, user_id, folder_name, parent='root'):
+    return _find_or_create_folder(token, user_id, folder_name, parent)["id"]
+
+
+def get_item_by_path(token: str, user_id: str, path: str, select: str = 'id,webUrl') -> dict | None:
+    """Resolve ``path`` with a single path-addressed request.
+
+    Returns the drive item with the ``select``ed properties or ``None`` when
+    the path does not exist.
+    """
+    headers = {'Authorization': f'Bearer {token}'}
+    url = f"{GRAPH_URL}/users/{user_id}/drive/root:/{quote(normalize_path(path))}"
+    try:
+        r = get_client().get(url, headers=headers, params={'$select': select})
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+    except requests.RequestException as e:
+        logger.exception("Error consultando ruta en OneDrive")
+        status = getattr(e.response, 'status_code', 0)
+        text = getattr(e.response, 'text', str(e))
+        raise GraphAPIError(status, text) from e
+    return r.json()
 
 
-def _get_folder_url(token: str, user_id: str, folder_id: str) -> str:
-    """Return the web URL for the given folder id."""
+def get_child(token: str, user_id: str, parent_id: str, name: str, select: str = 'id,size') -> dict | None:
+    """Return the item called ``name`` inside ``parent_id`` or ``None``."""
     headers = {'Authorization': f'Bearer {token}'}
-    url = f"https://graph.microsoft.com/v1.0/users/{user_id}/drive/items/{folder_id}"
+    url = f"{GRAPH_URL}/users/{user_id}/drive/items/{parent_id}:/{quote(name)}"
     try:
-        r = requests.get(url, headers=headers, params={'$select': 'webUrl'})
+        r = get_client().get(url, headers=headers, params={'$select': select})
+        if r.status_code == 404:
+            return None
         r.raise_for_status()
     except requests.RequestException as e:
-        logger.exception("Error obteniendo URL de carpeta en OneDrive")
+        logger.exception("Error consultando archivo en OneDrive")
         status = getattr(e.response, 'status_code', 0)
         text = getattr(e.response, 'text', str(e))
         raise GraphAPIError(status, text) from e
-    return r.json().get('webUrl', '')
+    return r.json()
 
 
-def upload_files(token, user_id, dest_path, files):
-    """Upload files to the given path in OneDrive.
+def get_folder_by_path(token: str, user_id: str, path: str) -> dict | None:
+    """Return ``id`` and ``webUrl`` of the folder at ``path`` or ``None``."""
+    return get_item_by_path(token, user_id, path)
+
+
+def read_item_head(token: str, user_id: str, item_id: str, length: int) -> bytes:
+    """Download the first ``length`` bytes of a file."""
+    url = f"{GRAPH_URL}/users/{user_id}/drive/items/{item_id}/content"
+    headers = {
+        'Authorization': f'Bearer {token}',
+        'Range': f'bytes=0-{length - 1}',
+    }
+    try:
+        r = get_client().get(url, headers=headers)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        logger.exception("Error leyendo archivo en OneDrive")
+        status = getattr(e.response, 'status_code', 0)
+        text = getattr(e.response, 'text', str(e))
+        raise GraphAPIError(status, text) from e
+    return r.content[:length]
+
 
-    The path must be normalized before being passed to this function.
-    Returns the web URL of the created folder.
+def _provision_folder_batch(token: str, user_id: str, dest_path: str) -> dict | None:
+    """Resolve and create ``dest_path`` with at most two ``$batch`` calls.
+
+    The first batch looks up every prefix of the path; the second creates the
+    missing segments chained with ``dependsOn``. Returns ``None`` when a
+    segment was created concurrently (409) so the caller can fall back to the
+    segment walk.
+    """
+    parts = dest_path.split("/")
+    prefixes = ["/".join(parts[: i + 1]) for i in range(len(parts))]
+    drive = f"/users/{user_id}/drive"
+
+    batch = GraphBatch(token)
+    lookups = [batch.add('GET', f"{drive}/root:/{quote(p)}?$select=id,webUrl") for p in prefixes]
+    results = batch.execute()
+    entry, existing = None, -1
+    for i, req_id in enumerate(lookups):
+        item = results.get(req_id, {})
+        if item.get('status') == 404:
+            break
+        entry = cache_folder(user_id, prefixes[i], raise_for_item(item))
+        existing = i
+    if existing == len(parts) - 1:
+        return entry
+
+    batch = GraphBatch(token)
+    creates = []
+    previous = None
+    for i in range(existing + 1, len(parts)):
+        parent = f"{drive}/root:/{quote(prefixes[i - 1])}:" if i > 0 else f"{drive}/root"
+        previous = batch.add(
+            'POST',
+            f"{parent}/children",
+            body={
+                "name": parts[i],
+                "folder": {},
+                "@microsoft.graph.conflictBehavior": "fail",
+            },
+            depends_on=previous,
+        )
+        creates.append((prefixes[i], previous))
+    results = batch.execute()
+    for path, req_id in creates:
+        item = results.get(req_id, {})
+        if item.get('status') == 409:
+            return None
+        entry = cache_folder(user_id, path, raise_for_item(item))
+    return entry
+
+
+def ensure_folder(token: str, user_id: str, dest_path: str) -> dict:
+    """Return ``{'id', 'webUrl'}`` for ``dest_path``, creating it if needed.
+
+    The cache is consulted first; on a miss the path is resolved and the
+    missing segments created through ``$batch`` (one or two round trips). If
+    another request created a segment at the same time, the segments are
+    walked one by one starting from the deepest cached ancestor.
     """
     dest_path = normalize_path(dest_path)
-    logger.info("Carpeta destino OneDrive: %s", dest_path)
-    parent_id = "root"
-    for part in dest_path.split("/"):
+    cached = get_cached_folder(user_id, dest_path)
+    if cached:
+        return cached
+    entry = _provision_folder_batch(token, user_id, dest_path)
+    if entry:
+        return entry
+
+    parts = dest_path.split("/")
+    start, parent_id = 0, "root"
+    for i in range(len(parts) - 1, 0, -1):
+        ancestor = get_cached_folder(user_id, "/".join(parts[:i]))
+        if ancestor:
+            start, parent_id = i, ancestor["id"]
+            break
+
+    for i in range(start, len(parts)):
         parent_ref = f"items/{parent_id}" if parent_id != "root" else parent_id
-        parent_id = create_folder_if_not_exists(token, user_id, part, parent_ref)
+        try:
+            item = _find_or_create_folder(token, user_id, parts[i], parent_ref)
+        except GraphAPIError as e:
+            if e.status_code != 404 or start == 0:
+                raise
+            # El ancestro en caché ya no existe: reintentar desde la raíz
+            invalidate_folder(user_id, "/".join(parts[:start]))
+            return ensure_folder(token, user_id, dest_path)
+        entry = cache_folder(user_id, "/".join(parts[: i + 1]), item)
+        parent_id = entry["id"]
+    return entry
 
-    folder_url = _get_folder_url(token, user_id, parent_id)
 
-    for f in files:
-        filename = get_valid_filename(f['name'])
-        content = f['content']
-        upload_url = (
-            f"https://graph.microsoft.com/v1.0/users/{user_id}/drive/items/{parent_id}:/{filename}:/content"
-        )
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/octet-stream',
-        }
+def create_upload_session(token: str, user_id: str, parent_id: str, filename: str) -> str:
+    """Create an upload session for ``filename`` and return its upload URL."""
+    url = (
+        f"{GRAPH_URL}/users/{user_id}/drive/items/{parent_id}:/{quote(filename)}:/createUploadSession"
+    )
+    headers = {
+        'Authorization': f'Bearer {token}',
+        'Content-Type': 'application/json',
+    }
+    data = {"item": {"@microsoft.graph.conflictBehavior": "replace"}}
+    try:
+        r = get_client().post(url, headers=headers, json=data)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        logger.exception("Error creando sesión de carga en OneDrive")
+        status = getattr(e.response, 'status_code', 0)
+        text = getattr(e.response, 'text', str(e))
+        raise GraphAPIError(status, text) from e
+    return r.json()["uploadUrl"]
+
+
+def _next_expected_offset(upload_url: str) -> int:
+    try:
+        r = get_client().get(upload_url)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        logger.exception("Error consultando estado de la sesión de carga")
+        status = getattr(e.response, 'status_code', 0)
+        text = getattr(e.response, 'text', str(e))
+        raise GraphAPIError(status, text) from e
+    ranges = r.json().get("nextExpectedRanges") or ["0-"]
+    return int(ranges[0].split("-")[0])
+
+
+def put_chunk(upload_url: str, chunk: bytes, offset: int, size: int):
+    """Send one chunk of an upload session.
+
+    Returns ``(item, next_offset)`` where ``item`` is the drive item once the
+    last chunk has been accepted and ``None`` before that.
+    """
+    headers = {
+        # La URL de la sesión ya está autenticada: no enviar el token
+        'Content-Range': f"bytes {offset}-{offset + len(chunk) - 1}/{size}",
+    }
+    try:
+        r = get_client().put(upload_url, headers=headers, data=chunk)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        status = getattr(e.response, 'status_code', 0)
+        text = getattr(e.response, 'text', str(e))
+        raise GraphAPIError(status, text) from e
+    if r.status_code in (200, 201):
+        # Las sesiones de adjuntos de Outlook responden 201 sin cuerpo
+        return (r.json() if r.content else {}), size
+    ranges = r.json().get("nextExpectedRanges") or [f"{offset + len(chunk)}-"]
+    return None, int(ranges[0].split("-")[0])
+
+
+def cancel_upload_session(upload_url: str) -> None:
+    """Discard an unfinished upload session (best effort)."""
+    try:
+        get_client().delete(upload_url)
+    except requests.RequestException:
+        logger.warning("No se pudo cancelar la sesión de carga", exc_info=True)
+
+
+def upload_chunks(upload_url, fileobj, size, chunk_size=UPLOAD_CHUNK_SIZE, progress=None):
+    """Upload ``fileobj`` to an upload session in ``chunk_size`` pieces.
+
+    Only one chunk is held in memory at a time. After a transient failure the
+    session is queried and the upload resumes from the last acknowledged
+    range. ``progress`` is called as ``progress(uploaded, size)``. Returns the
+    resulting drive item.
+    """
+    offset = 0
+    resumes = 0
+    while True:
+        fileobj.seek(offset)
+        chunk = fileobj.read(min(chunk_size, size - offset))
         try:
-            r = requests.put(upload_url, headers=headers, data=content)
+            item, offset = put_chunk(upload_url, chunk, offset, size)
+        except GraphAPIError as e:
+            transient = e.status_code == 0 or e.status_code >= 500 or e.status_code == 416
+            if not transient or resumes >= UPLOAD_MAX_RESUMES:
+                logger.exception("Error subiendo parte de archivo a OneDrive")
+                raise
+            resumes += 1
+            offset = _next_expected_offset(upload_url)
+            logger.warning("Reanudando carga desde el byte %s (%s/%s)", offset, resumes, UPLOAD_MAX_RESUMES)
+            continue
+        if progress:
+            progress(offset, size)
+        if item is not None:
+            return item
+
+
+def move_item(token: str, user_id: str, item_id: str, parent_id: str, name: str) -> dict:
+    """Move (and rename) a drive item into ``parent_id``."""
+    url = f"{GRAPH_URL}/users/{user_id}/drive/items/{item_id}"
+    headers = {
+        'Authorization': f'Bearer {token}',
+        'Content-Type': 'application/json',
+    }
+    data = {"parentReference": {"id": parent_id}, "name": name}
+    try:
+        r = get_client().patch(
+            url,
+            headers=headers,
+            json=data,
+            params={"@microsoft.graph.conflictBehavior": "replace"},
+        )
+        r.raise_for_status()
+    except requests.RequestException as e:
+        logger.exception("Error moviendo archivo en OneDrive")
+        status = getattr(e.response, 'status_code', 0)
+        text = getattr(e.response, 'text', str(e))
+        raise GraphAPIError(status, text) from e
+    return r.json()
+
+
+def delete_item(token: str, user_id: str, item_id: str) -> None:
+    """Delete a drive item, ignoring items that no longer exist."""
+    url = f"{GRAPH_URL}/users/{user_id}/drive/items/{item_id}"
+    try:
+        r = get_client().delete(url, headers={'Authorization': f'Bearer {token}'})
+        if r.status_code != 404:
             r.raise_for_status()
-        except requests.RequestException as e:
-            logger.exception("Error subiendo archivo a OneDrive")
-            status = getattr(e.response, 'status_code', 0)
-            text = getattr(e.response, 'text', str(e))
-            raise GraphAPIError(status, text) from e
+    except requests.RequestException as e:
+        logger.exception("Error eliminando archivo en OneDrive")
+        status = getattr(e.response, 'status_code', 0)
+        text = getattr(e.response, 'text', str(e))
+        raise GraphAPIError(status, text) from e
+
+
+def _upload_file(token: str, user_id: str, parent_id: str, f: dict, progress=None) -> str:
+    """Upload one file entry.
+
+    ``f`` holds ``name`` plus either ``content`` (bytes), ``file`` (a
+    seekable file-like object) and ``size``, or ``item_id`` of a file already
+    staged in OneDrive, which is moved into place. Files above
+    ``UPLOAD_SESSION_THRESHOLD`` go through a chunked upload session.
+    """
+    filename = get_valid_filename(f['name'])
+    if 'item_id' in f:
+        try:
+            move_item(token, user_id, f['item_id'], parent_id, filename)
+        except GraphAPIError as e:
+            # Un intento anterior pudo moverlo antes de fallar con otro archivo
+            if e.status_code != 404:
+                raise
+            existing = get_child(token, user_id, parent_id, filename)
+            if existing is None or existing.get('size') != f['size']:
+                raise
+            logger.info("Archivo ya estaba en su destino: %s", filename)
+        if progress:
+            progress(filename, f['size'], f['size'])
+        logger.info("Archivo movido desde staging: %s", filename)
+        return filename
+    if 'content' in f:
+        size = len(f['content'])
+    else:
+        size = f['size']
+
+    if size > UPLOAD_SESSION_THRESHOLD:
+        fileobj = f.get('file') or io.BytesIO(f['content'])
+        upload_url = create_upload_session(token, user_id, parent_id, filename)
+
+        def report(uploaded, total):
+            logger.info("Subiendo %s: %s/%s bytes", filename, uploaded, total)
+            if progress:
+                progress(filename, uploaded, total)
+
+        upload_chunks(upload_url, fileobj, size, progress=report)
         logger.info("Archivo subido: %s", filename)
+        return filename
+
+    if 'content' in f:
+        content = f['content']
+    else:
+        f['file'].seek(0)
+        content = f['file'].read()
+    upload_url = (
+        f"{GRAPH_URL}/users/{user_id}/drive/items/{parent_id}:/{quote(filename)}:/content"
+    )
+    headers = {
+        'Authorization': f'Bearer {token}',
+        'Content-Type': 'application/octet-stream',
+    }
+    try:
+        r = get_client().put(upload_url, headers=headers, data=content)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        logger.exception("Error subiendo archivo a OneDrive")
+        status = getattr(e.response, 'status_code', 0)
+        text = getattr(e.response, 'text', str(e))
+        raise GraphAPIError(status, text) from e
+    if progress:
+        progress(filename, size, size)
+    logger.info("Archivo subido: %s", filename)
+    return filename
+
+
+def _upload_all(token, user_id, parent_id, files, progress, concurrency):
+    """Upload ``files`` and return a list of ``(entry, GraphAPIError)`` failures."""
+
+    def upload(f):
+        try:
+            _upload_file(token, user_id, parent_id, f, progress)
+        except GraphAPIError as e:
+            return f, e
+        return None
+
+    if concurrency <= 1 or len(files) <= 1:
+        results = [upload(f) for f in files]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(files))) as pool:
+            results = list(pool.map(upload, files))
+    return [r for r in results if r]
+
+
+def upload_files(token, user_id, dest_path, files, progress=None, concurrency=1):
+    """Upload files to the given path in OneDrive.
+
+    The path must be normalized before being passed to this function. Each
+    entry in ``files`` carries ``content`` bytes or a ``file`` object with its
+    ``size``; ``progress(name, uploaded, total)`` is called as data is sent.
+    Up to ``concurrency`` files are uploaded in parallel. If any file fails a
+    single ``GraphAPIError`` listing the failed files is raised. Returns the
+    web URL of the created folder.
+    """
+    dest_path = normalize_path(dest_path)
+    logger.info("Carpeta destino OneDrive: %s", dest_path)
+    folder = ensure_folder(token, user_id, dest_path)
+    concurrency = max(1, min(int(concurrency or 1), MAX_UPLOAD_CONCURRENCY))
+
+    failures = _upload_all(token, user_id, folder['id'], files, progress, concurrency)
+    if failures and all(e.status_code == 404 for _, e in failures):
+        # La carpeta en caché fue eliminada o movida en OneDrive
+        logger.info("Carpeta en caché no encontrada, resolviendo de nuevo: %s", dest_path)
+        invalidate_folder(user_id, dest_path)
+        folder = ensure_folder(token, user_id, dest_path)
+        failures = _upload_all(
+            token, user_id, folder['id'], [f for f, _ in failures], progress, concurrency
+        )
+
+    if failures:
+        names = [f['name'] for f, _ in failures]
+        if len(failures) == 1:
+            error = failures[0][1]
+            raise GraphAPIError(error.status_code, error.message, files=names) from error
+        statuses = {e.status_code for _, e in failures}
+        status = statuses.pop() if len(statuses) == 1 else 0
+        detail = '; '.join(f"{f['name']}: {e.message}" for f, e in failures)
+        raise GraphAPIError(status, detail, files=names)
 
-    return folder_url
+    return folder['webUrl']
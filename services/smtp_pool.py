@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPPool:
+    """Conexiones SMTP autenticadas reutilizables por (host, puerto, usuario).
+
+    Cada conexión hace STARTTLS y login una sola vez y se devuelve al pool
+    después de usarla. Antes de reutilizar una conexión que estuvo inactiva
+    se comprueba con NOOP; las que superan ``max_idle_time`` se cierran.
+    """
+
+    def __init__(
+        self,
+        max_idle: int = 2,
+        max_idle_time: float = 240.0,
+        noop_after: float = 10.0,
+        timeout: float = 30.0,
+    ):
+        self.max_idle = max_idle
+        self.max_idle_time = max_idle_time
+        self.noop_after = noop_after
+        self.timeout = timeout
+        self._idle: dict[tuple, list[tuple[smtplib.SMTP, float]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(host: str, port: int, user: str, password: str) -> tuple:
+        # La huella de la contraseña evita reutilizar sesiones de credenciales anteriores
+        secret = hashlib.sha256(password.encode()).hexdigest()
+        return (host.lower(), int(port), user.lower(), secret)
+
+    def _connect(self, host: str, port: int, user: str, password: str) -> smtplib.SMTP:
+        server = smtplib.SMTP(host, port, timeout=self.timeout)
+        try:
+            server.starttls()
+            server.login(user, password)
+        except Exception:
+            self._close(server)
+            raise
+        logger.info('Conexión SMTP abierta: %s@%s:%s', user, host, port)
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def _alive(self, server: smtplib.SMTP, idle_since: float) -> bool:
+        idle = time.monotonic() - idle_since
+        if idle > self.max_idle_time:
+            return False
+        if idle < self.noop_after:
+            return True
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _acquire(self, key: tuple) -> smtplib.SMTP | None:
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                server, since = idle.pop()
+            if self._alive(server, since):
+                return server
+            self._close(server)
+
+    def _release(self, key: tuple, server: smtplib.SMTP) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((server, time.monotonic()))
+                return
+        self._close(server)
+
+    @contextmanager
+    def connection(self, host: str, port: int, user: str, password: str):
+        """Entrega una conexión autenticada y la devuelve al pool al salir.
+
+        Si el bloque lanza una excepción la conexión se descarta.
+        """
+        key = self._key(host, port, user, password)
+        server = self._acquire(key) or self._connect(host, port, user, password)
+        try:
+            yield server
+        except BaseException:
+            self._close(server)
+            raise
+        self._release(key, server)
+
+    def send_messages(self, host: str, port: int, user: str, password: str, messages) -> None:
+        """Envía varios mensajes en una misma sesión.
+
+        Cada elemento es un ``Message`` o una tupla ``(Message, destinatarios)``
+        cuando el sobre debe incluir direcciones que no van en los
+        encabezados (Bcc). Si el servidor cerró la conexión se abre otra y
+        se continúa desde el mensaje que falló.
+        """
+        pending = list(messages)
+        reconnected = False
+        while pending:
+            try:
+                with self.connection(host, port, user, password) as server:
+                    while pending:
+                        item = pending[0]
+                        if isinstance(item, tuple):
+                            server.send_message(item[0], to_addrs=item[1])
+                        else:
+                            server.send_message(item)
+                        pending.pop(0)
+            except smtplib.SMTPServerDisconnected:
+                if reconnected:
+                    raise
+                logger.warning('Conexión SMTP cerrada por el servidor, reconectando')
+                reconnected = True
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle = [server for conns in self._idle.values() for server, _ in conns]
+            self._idle.clear()
+        for server in idle:
+            self._close(server)
+
+
+_pool: SMTPPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPPool:
+    """Pool SMTP compartido por el proceso."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SMTPPool()
+    return _pool
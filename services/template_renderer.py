@@ -1,30 +1,109 @@
 import re
 from datetime import datetime
+from functools import lru_cache
+from typing import Iterable
 from zoneinfo import ZoneInfo
 
 TZ_ECUADOR = ZoneInfo('America/Guayaquil')
 
+# [VARIABLE] o [FECHA:formato]; el formato de fecha admite espacios y minúsculas
+VAR_PATTERN = re.compile(r'\[(FECHA(?::[^\]\[]*)?|[A-Z0-9:_-]+)\]')
+DATE_TOKENS = re.compile(r'YYYY|YY|MM|DD|HH|mm|ss|%')
+DATE_TOKEN_FORMATS = {
+    'YYYY': '%Y',
+    'YY': '%y',
+    'MM': '%m',
+    'DD': '%d',
+    'HH': '%H',
+    'mm': '%M',
+    'ss': '%S',
+    '%': '%%',
+}
+DEFAULT_DATE_FORMAT = '%Y-%m-%d'
+
+# Tipos de segmento de una plantilla compilada
+LITERAL = 0
+VARIABLE = 1
+DATE = 2
+
+
 def normalize_var(name: str) -> str:
     """Normalize field name to variable name (A_Z_0_9)."""
     return re.sub(r'[^A-Z0-9]', '_', name.upper())
 
 
-def render_text(template: str, variables: dict) -> str:
+def date_format(fmt: str) -> str:
+    """Translate a ``YYYY-MM-DD HH:mm`` style format to ``strftime``.
+
+    Formats already written with ``%`` directives are used as is.
+    """
+    if not fmt:
+        return DEFAULT_DATE_FORMAT
+    if '%' in fmt:
+        return fmt
+    return DATE_TOKENS.sub(lambda m: DATE_TOKEN_FORMATS[m.group(0)], fmt)
+
+
+class CompiledTemplate:
+    """Template split into literal, variable and date segments."""
+
+    __slots__ = ('segments', 'has_dates')
+
+    def __init__(self, template: str):
+        segments = []
+        pos = 0
+        for match in VAR_PATTERN.finditer(template):
+            if match.start() > pos:
+                segments.append((LITERAL, template[pos:match.start()], None))
+            key = match.group(1)
+            if key.startswith('FECHA'):
+                _, _, fmt = key.partition(':')
+                segments.append((DATE, date_format(fmt), None))
+            else:
+                segments.append((VARIABLE, key, match.group(0)))
+            pos = match.end()
+        if pos < len(template):
+            segments.append((LITERAL, template[pos:], None))
+        self.segments = tuple(segments)
+        self.has_dates = any(kind == DATE for kind, _, _ in segments)
+
+    def render(self, variables: dict, now: datetime | None = None) -> str:
+        if self.has_dates and now is None:
+            now = datetime.now(TZ_ECUADOR)
+        parts = []
+        for kind, value, original in self.segments:
+            if kind == LITERAL:
+                parts.append(value)
+            elif kind == VARIABLE:
+                parts.append(str(variables.get(value, original)))
+            else:
+                parts.append(now.strftime(value))
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=512)
+def compile_template(template: str) -> CompiledTemplate:
+    """Compile ``template`` once; later calls reuse the cached result."""
+    return CompiledTemplate(template)
+
+
+def render_text(template: str, variables: dict, now: datetime | None = None) -> str:
     """Replace [VARIABLE] patterns in template using provided variables.
 
     Supports [FECHA] with optional format e.g. [FECHA:YYYY-MM-DD HH:mm].
-    Dates are rendered in Ecuador timezone.
+    Dates are rendered in Ecuador timezone, using a single timestamp per
+    render (or ``now`` when given).
     """
     if not template:
         return ''
+    return compile_template(template).render(variables, now)
 
-    def repl(match: re.Match) -> str:
-        key = match.group(1)
-        if key.startswith('FECHA'):
-            fmt = '%Y-%m-%d'
-            if ':' in key:
-                _, fmt = key.split(':', 1)
-            return datetime.now(TZ_ECUADOR).strftime(fmt)
-        return str(variables.get(key, match.group(0)))
 
-    return re.sub(r'\[([A-Z0-9:_-]+)\]', repl, template)
+def render_many(template: str, variable_maps: Iterable[dict], now: datetime | None = None) -> list[str]:
+    """Render ``template`` once per variable map with a shared timestamp."""
+    if not template:
+        return ['' for _ in variable_maps]
+    compiled = compile_template(template)
+    if now is None and compiled.has_dates:
+        now = datetime.now(TZ_ECUADOR)
+    return [compiled.render(variables, now) for variables in variable_maps]